@@ -0,0 +1,299 @@
+"""
+End-to-end load benchmark for the ask_software_engineer MCP tool.
+
+Starts benchmarks/mock_groq.py as a local upstream, points the consultant
+at it and calls the tool through an in-memory MCP client session at
+increasing concurrency. Each level reports throughput, p50/p95/p99
+latency, the fallback rate and process memory; results are written as
+JSON so runs can be compared between versions:
+
+    python benchmarks/bench_e2e.py --concurrency 1,8,32,128 --requests 200
+    python benchmarks/bench_e2e.py --baseline benchmarks/results/old.json
+
+With --baseline the run exits non-zero when throughput drops or p95
+latency grows by more than --max-regression at any shared level.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_groq import ANSWER_PREFIX, add_server_arguments  # noqa: E402
+
+PROMPTS = [
+    "How should I structure a service that ingests {n} events per second?",
+    "What are the trade-offs of caching request {n} at the edge?",
+    "Review the error handling strategy for job {n} in our queue workers.",
+    "How do we reduce p99 latency for endpoint {n}?",
+]
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def rss_mb():
+    """Current resident set size in MiB (Linux), else the peak."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def start_mock(args):
+    """Run the mock upstream in its own process and return (process, url)."""
+    command = [sys.executable, os.path.join(BENCH_DIR, "mock_groq.py"), "--port", "0",
+               "--latency", args.latency, "--tokens", str(args.tokens),
+               "--tokens-per-second", str(args.tokens_per_second),
+               "--error-429-rate", str(args.error_429_rate), "--error-5xx-rate", str(args.error_5xx_rate),
+               "--timeout-rate", str(args.timeout_rate), "--retry-after", str(args.retry_after)]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith("Mock Groq listening on "):
+        process.kill()
+        raise SystemExit(f"Mock server failed to start: {line!r}")
+    return process, line.rsplit(" ", 1)[1].strip()
+
+
+def configure_environment(args, url):
+    """Point the consultant at the mock; explicit environment settings win."""
+    os.environ["GROQ_API_URL"] = url
+    os.environ.setdefault("GROQ_API_KEY", "gsk_benchmark_key_not_used_upstream")
+    # Every request should reach the upstream unless caching is being measured
+    os.environ.setdefault("CONSULTANT_CACHE_ENABLED", "1" if args.cache else "0")
+    if not args.verbose:
+        # The log pipeline writes from its own thread, so quiet_server can't redirect it;
+        # per-consultation INFO lines would otherwise flood the results table
+        os.environ.setdefault("CONSULTANT_LOG_LEVEL", "WARNING")
+
+
+@contextlib.contextmanager
+def quiet_server(enabled):
+    """
+    Send the server's prints to /dev/null while measuring. Its log output is
+    kept down to warnings by configure_environment instead.
+    """
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+async def run_level(session, concurrency, requests, args, level_index):
+    """Issue requests tool calls with at most concurrency in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = {"ok": 0, "fallback": 0, "error": 0}
+    arguments = {"stream": args.stream}
+    if args.deadline_ms:
+        arguments["deadline_ms"] = args.deadline_ms
+
+    async def on_progress(progress, total, message):
+        pass
+
+    async def one(i):
+        prompt = PROMPTS[i % len(PROMPTS)].format(n=f"{level_index}-{i}")
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await session.call_tool(
+                    "ask_software_engineer", dict(arguments, prompt=prompt),
+                    progress_callback=on_progress if args.stream else None,
+                )
+            except Exception:
+                outcomes["error"] += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+            text = result.content[0].text if result.content else ""
+            if result.isError:
+                outcomes["error"] += 1
+            elif text.startswith(ANSWER_PREFIX):
+                outcomes["ok"] += 1
+            else:
+                outcomes["fallback"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 0.50), 1) if ordered else None,
+            "p95": round(percentile(ordered, 0.95), 1) if ordered else None,
+            "p99": round(percentile(ordered, 0.99), 1) if ordered else None,
+            "max": round(ordered[-1], 1) if ordered else None,
+            "mean": round(sum(ordered) / len(ordered), 1) if ordered else None,
+        },
+        "ok": outcomes["ok"],
+        "fallbacks": outcomes["fallback"],
+        "errors": outcomes["error"],
+        "fallback_rate": round(outcomes["fallback"] / requests, 4) if requests else 0.0,
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def fetch_mock_stats(url):
+    import httpx
+    stats_url = url.split("/openai/", 1)[0] + "/stats"
+    async with httpx.AsyncClient() as client:
+        return (await client.get(stats_url)).json()
+
+
+async def run_benchmark(args, url):
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    import mcpserver
+
+    print(f"{'conc':>6} {'requests':>8} {'rps':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'fallback':>10} {'rss MiB':>8}")
+    with quiet_server(not args.verbose):
+        levels = []
+        async with create_connected_server_and_client_session(mcpserver.mcp._mcp_server) as session:
+            # One untimed call so imports, the connection pool and caches are warm
+            await session.call_tool("ask_software_engineer", {"prompt": "warm up", "stream": args.stream})
+            for i, concurrency in enumerate(args.concurrency):
+                requests = max(args.requests, concurrency)
+                level = await run_level(session, concurrency, requests, args, i)
+                levels.append(level)
+                print(format_row(level), file=sys.__stdout__, flush=True)
+            server_stats = json.loads(
+                (await session.read_resource("stats://consultant")).contents[0].text
+            )
+        mock_stats = await fetch_mock_stats(url)
+    return levels, server_stats, mock_stats
+
+
+def format_row(level):
+    latency = level["latency_ms"]
+    return (f"{level['concurrency']:>6} {level['requests']:>8} {level['throughput_rps']:>10} "
+            f"{latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} "
+            f"{level['fallback_rate'] * 100:>9.1f}% {level['rss_mb']:>8}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, max_regression):
+    """Return regression messages for levels present in both runs."""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    shared = [level for level in results["levels"] if level["concurrency"] in previous]
+    if not shared:
+        return ["no concurrency levels in common with the baseline"]
+    problems = []
+    for level in shared:
+        old = previous[level["concurrency"]]
+        if old["throughput_rps"] and level["throughput_rps"] < old["throughput_rps"] * (1 - max_regression):
+            problems.append(f"c={level['concurrency']}: throughput {old['throughput_rps']} -> "
+                            f"{level['throughput_rps']} rps")
+        old_p95, new_p95 = old["latency_ms"]["p95"], level["latency_ms"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + max_regression):
+            problems.append(f"c={level['concurrency']}: p95 {old_p95} -> {new_p95} ms")
+        if level["fallback_rate"] > old["fallback_rate"] + max_regression:
+            problems.append(f"c={level['concurrency']}: fallback rate {old['fallback_rate']} -> "
+                            f"{level['fallback_rate']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for ask_software_engineer")
+    parser.add_argument("--concurrency", default="1,4,16,64",
+                        type=lambda value: [int(v) for v in value.split(",") if v],
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="tool calls per level")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True,
+                        help="call the tool with streaming and progress notifications")
+    parser.add_argument("--deadline-ms", type=int, default=None, help="deadline_ms passed to the tool")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache enabled")
+    parser.add_argument("--output", default=None, help="results file (default benchmarks/results/e2e-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="allowed relative throughput/p95 regression against --baseline")
+    parser.add_argument("--verbose", action="store_true", help="keep the server's own output")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    process, url = start_mock(args)
+    try:
+        configure_environment(args, url)
+        levels, server_stats, mock_stats = asyncio.run(run_benchmark(args, url))
+    finally:
+        process.kill()
+        process.wait()
+
+    results = {
+        "benchmark": "ask_software_engineer_e2e",
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "stream": args.stream,
+            "deadline_ms": args.deadline_ms,
+            "cache": args.cache,
+            "mock": {
+                "latency": args.latency, "tokens": args.tokens, "tokens_per_second": args.tokens_per_second,
+                "error_429_rate": args.error_429_rate, "error_5xx_rate": args.error_5xx_rate,
+                "timeout_rate": args.timeout_rate, "retry_after": args.retry_after, "seed": args.seed,
+            },
+        },
+        "levels": levels,
+        "mock_stats": mock_stats,
+        "server_stats": server_stats,
+    }
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"e2e-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            problems = compare(results, json.load(baseline_file), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for the offline fallback path.
+
+Compares the compiled FallbackEngine with the previous implementation
+(lowercase + chained substring scans + an f-string per template) on
+per-call latency and peak allocated memory. Run from the repository root:
+
+    python benchmarks/bench_fallback.py [--iterations N] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fallback_engine import CATEGORY_TEMPLATES, FALLBACK_ENGINE  # noqa: E402
+
+# The old templates were f-strings: the text around the query joined per call
+LEGACY_TEMPLATES = {name: template.split("{query}") for name, template in CATEGORY_TEMPLATES.items()}
+
+QUERIES = [
+    "Please review my authentication module for code quality problems",
+    "Our checkout endpoint is slow, how do I find the bottleneck?",
+    "How should we design the architecture of a multi-tenant billing system?",
+    "I keep getting a KeyError when parsing the config, how do I debug it?",
+    "Is storing session tokens in localStorage a security vulnerability?",
+    "What should a team of five engineers focus on next quarter?",
+]
+
+# Multi-paragraph prompts, where scanning cost dominates
+LONG_QUERIES = [
+    "We are planning the next quarter for a team of five engineers on a payments product. " * 15,
+    "Here is the handler: it parses the request, loads the user and writes an audit row. " * 12
+    + "Could you review it?",
+]
+
+LEGACY_KEYWORDS = [
+    ("code_review", ["review", "analyze", "assessment"]),
+    ("optimization", ["optimize", "performance", "slow", "bottleneck"]),
+    ("architecture", ["architecture", "design", "structure", "system"]),
+    ("debugging", ["debug", "error", "bug", "issue", "problem"]),
+    ("security", ["security", "vulnerability", "secure"]),
+]
+
+
+def legacy_respond(query):
+    """The substring chain and template formatting the engine replaced."""
+    query_lower = query.lower()
+    category = "general"
+    for name, words in LEGACY_KEYWORDS:
+        if any(word in query_lower for word in words):
+            category = name
+            break
+    before, after = LEGACY_TEMPLATES[category]
+    return f"{before}{query}{after}"
+
+
+def time_per_call(respond, queries, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for query in queries:
+            respond(query)
+    return (time.perf_counter() - started) / (iterations * len(queries)) * 1e6
+
+
+def peak_bytes_per_call(respond, queries, iterations):
+    """Average peak of memory allocated while a single call runs."""
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(iterations):
+            for query in queries:
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                respond(query)
+                total += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    return total / (iterations * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    for query in QUERIES + LONG_QUERIES:
+        if legacy_respond(query) != FALLBACK_ENGINE.respond(query):
+            raise SystemExit(f"Engine and legacy output differ for {query!r}")
+
+    results = {}
+    for workload, queries in (("short", QUERIES), ("long", LONG_QUERIES)):
+        rows = {}
+        for name, respond in (("legacy", legacy_respond), ("engine", FALLBACK_ENGINE.respond)):
+            time_per_call(respond, queries, 1000)  # warm up
+            rows[name] = {
+                "us_per_call": round(time_per_call(respond, queries, args.iterations), 3),
+                "peak_bytes_per_call": round(peak_bytes_per_call(respond, queries, 200)),
+            }
+        rows["speedup"] = round(rows["legacy"]["us_per_call"] / rows["engine"]["us_per_call"], 2)
+        results[workload] = rows
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'':14} {'us/call':>10} {'peak bytes/call':>16}")
+    for workload, rows in results.items():
+        for name in ("legacy", "engine"):
+            row = rows[name]
+            print(f"{workload + ' ' + name:14} {row['us_per_call']:>10} {row['peak_bytes_per_call']:>16}")
+        print(f"{workload + ' speedup':14} {rows['speedup']:>9}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Request body assembly and response decoding, before and after.
+
+  before  json.dumps(data).encode("utf-8") over the whole request, with
+          the system prompt indented as it was written in the source,
+          and json.loads(body.decode("utf-8")) for responses
+  after   json_codec.BODY_ENCODER (cached parameter and system prompt
+          fragments, orjson when installed) with the dedented prompt,
+          and json_codec.loads straight from bytes
+
+Also reports the request size and the estimated prompt tokens saved by
+the dedent.
+
+    python benchmarks/bench_request_body.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import json_codec  # noqa: E402
+from agents_updated import SoftwareEngineerAgent  # noqa: E402
+from history_manager import estimate_message_tokens  # noqa: E402
+from json_codec import RequestBodyEncoder  # noqa: E402
+
+ANSWER = ("Start by measuring where the time goes before changing anything. " * 40).strip()
+
+
+def request(system_prompt, turns):
+    messages = [{"role": "system", "content": system_prompt}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Follow-up question {i} about the queue workers' retries?"})
+        messages.append({"role": "assistant", "content": ANSWER[:600]})
+    messages.append({"role": "user", "content": "How should we cap retries for the ingestion workers?"})
+    return {"model": "qwen-2.5-coder-32b", "messages": messages, "temperature": 0.3,
+            "max_tokens": 2048, "top_p": 0.95, "stream": False}
+
+
+def per_call_us(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request body assembly and response decoding, before and after")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    dedented = SoftwareEngineerAgent(stateful=False).system_prompt
+    # The prompt as it was written inside __init__: 8-space indent, leading newline, trailing indent
+    indented = "\n" + textwrap.indent(dedented, " " * 8) + "\n" + " " * 8
+
+    stdlib = RequestBodyEncoder()
+    results = {"orjson": json_codec.ORJSON_AVAILABLE, "requests": [], "decode": {}}
+    for turns in (0, 2, 8):
+        before_data, after_data = request(indented, turns), request(dedented, turns)
+        before_body = json.dumps(before_data).encode("utf-8")
+        after_body = json_codec.BODY_ENCODER.encode(after_data)
+        assert json.loads(after_body) == after_data
+        orjson_available = json_codec.ORJSON_AVAILABLE
+        json_codec.ORJSON_AVAILABLE = False
+        try:
+            stdlib_us = per_call_us(lambda: stdlib.encode(after_data), args.iterations)
+        finally:
+            json_codec.ORJSON_AVAILABLE = orjson_available
+        results["requests"].append({
+            "turns": turns,
+            "before_us": per_call_us(lambda: json.dumps(before_data).encode("utf-8"), args.iterations),
+            "after_us": per_call_us(lambda: json_codec.BODY_ENCODER.encode(after_data), args.iterations),
+            "after_stdlib_us": stdlib_us,
+            "before_bytes": len(before_body),
+            "after_bytes": len(after_body),
+            "before_tokens": estimate_message_tokens(before_data["messages"]),
+            "after_tokens": estimate_message_tokens(after_data["messages"]),
+        })
+
+    response = json.dumps({
+        "id": "chatcmpl-bench", "object": "chat.completion", "model": "qwen-2.5-coder-32b",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 600, "completion_tokens": 500, "total_tokens": 1100},
+    }).encode("utf-8")
+    chunk = b'{"id":"chatcmpl-bench","choices":[{"index":0,"delta":{"content":" retries"}}]}'
+    results["decode"] = {
+        "response_before_us": per_call_us(lambda: json.loads(response.decode("utf-8")), args.iterations),
+        "response_after_us": per_call_us(lambda: json_codec.loads(response), args.iterations),
+        "chunk_before_us": per_call_us(lambda: json.loads(chunk.decode("utf-8")), args.iterations),
+        "chunk_after_us": per_call_us(lambda: json_codec.loads(chunk), args.iterations),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"orjson: {'yes' if results['orjson'] else 'no (stdlib json)'}")
+    print(f"{'turns':>5} {'before us':>10} {'after us':>9} {'stdlib us':>10} {'bytes':>13} {'est. tokens':>13}")
+    for row in results["requests"]:
+        print(f"{row['turns']:>5} {row['before_us']:>10.2f} {row['after_us']:>9.2f} {row['after_stdlib_us']:>10.2f} "
+              f"{row['before_bytes']:>6}->{row['after_bytes']:<6} {row['before_tokens']:>6}->{row['after_tokens']:<6}")
+    decode = results["decode"]
+    print(f"decode response: {decode['response_before_us']:.2f} -> {decode['response_after_us']:.2f} us, "
+          f"stream chunk: {decode['chunk_before_us']:.2f} -> {decode['chunk_after_us']:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
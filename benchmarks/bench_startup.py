@@ -0,0 +1,156 @@
+"""
+Cold start of the MCP server, with a regression budget.
+
+  import     `python -X importtime -c "import mcpserver"`: the server's own
+             import time, i.e. mcpserver's cumulative time minus the mcp
+             framework it builds on (median of --runs)
+  handshake  spawn `serve.py --transport stdio` and time the first
+             initialize request until its response arrives
+  lazy       after importing mcpserver and calling `add` and reading
+             consultation://, none of the HTTP client, agent, cache or
+             session store modules may be loaded
+
+Exits with status 1 when the import time is over --budget-ms, the handshake
+is over --handshake-budget-ms (if given) or a lazy module was loaded.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 40
+    python benchmarks/bench_startup.py --src /path/to/other/checkout/src   # compare
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Modules that only consultations may load
+LAZY_MODULES = (
+    "agents_updated", "groq_client", "endpoint_router", "h2", "response_cache", "similarity_index",
+    "session_store", "sqlite_wal", "history_manager", "generation_policy", "json_codec", "cache_warmer", "sqlite3",
+)
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)")
+
+LAZY_CHECK = """
+import asyncio, json, sys
+import mcpserver
+async def main():
+    await mcpserver.mcp.call_tool("add", {"a": 1, "b": 2})
+    await mcpserver.mcp.read_resource("consultation://architecture")
+asyncio.run(main())
+print(json.dumps([name for name in %r if name in sys.modules]))
+""" % (LAZY_MODULES,)
+
+
+def server_env(src):
+    env = dict(os.environ, PYTHONPATH=src, PYTHONDONTWRITEBYTECODE="1")
+    # Never send a real key anywhere while benchmarking
+    env["GROQ_API_KEY"] = ""
+    env.setdefault("CONSULTANT_LOG_LEVEL", "WARNING")
+    return env
+
+
+def import_times(src):
+    """Return (mcpserver cumulative ms, mcp framework cumulative ms) for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import mcpserver"],
+        cwd=src, env=server_env(src), capture_output=True, text=True, check=True,
+    )
+    total = framework = 0.0
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        name, cumulative_ms = match.group(2), int(match.group(1)) / 1000
+        if name == "mcpserver":
+            total = cumulative_ms
+        elif name == "mcp" or name.startswith("mcp."):
+            # The outermost mcp entry includes everything the framework imports
+            framework = max(framework, cumulative_ms)
+    return total, framework
+
+
+def handshake_ms(src, timeout=30.0):
+    """Spawn the stdio server and time an initialize request until its response."""
+    request = {
+        "jsonrpc": "2.0", "id": 1, "method": "initialize",
+        "params": {"protocolVersion": "2025-06-18", "capabilities": {},
+                   "clientInfo": {"name": "bench_startup", "version": "1"}},
+    }
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(src, "serve.py"), "--transport", "stdio"],
+        cwd=src, env=server_env(src), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        process.stdin.write(json.dumps(request) + "\n")
+        process.stdin.flush()
+        while True:
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("server exited before answering initialize")
+            if '"id":1' in line.replace(" ", ""):
+                return (time.perf_counter() - started) * 1000
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError("no initialize response")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def lazy_modules_loaded(src):
+    result = subprocess.run(
+        [sys.executable, "-c", LAZY_CHECK], cwd=src, env=server_env(src),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start of the MCP server, with a regression budget")
+    parser.add_argument("--src", default=SRC_DIR, help="src directory of the checkout to measure")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=40.0,
+                        help="maximum median import time of the server's own code, excluding mcp")
+    parser.add_argument("--handshake-budget-ms", type=float, default=None,
+                        help="maximum median spawn-to-initialize time (machine dependent, off by default)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    imports = [import_times(args.src) for _ in range(args.runs)]
+    handshakes = [handshake_ms(args.src) for _ in range(args.runs)]
+    results = {
+        "import_total_ms": round(statistics.median(total for total, _ in imports), 1),
+        "import_mcp_ms": round(statistics.median(mcp for _, mcp in imports), 1),
+        "import_own_ms": round(statistics.median(total - mcp for total, mcp in imports), 1),
+        "handshake_ms": round(statistics.median(handshakes), 1),
+        "lazy_modules_loaded": lazy_modules_loaded(args.src),
+    }
+    failures = []
+    if results["import_own_ms"] > args.budget_ms:
+        failures.append(f"import took {results['import_own_ms']} ms, budget {args.budget_ms} ms")
+    if args.handshake_budget_ms is not None and results["handshake_ms"] > args.handshake_budget_ms:
+        failures.append(f"handshake took {results['handshake_ms']} ms, budget {args.handshake_budget_ms} ms")
+    if results["lazy_modules_loaded"]:
+        failures.append(f"loaded without a consultation: {', '.join(results['lazy_modules_loaded'])}")
+    results["failures"] = failures
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"import mcpserver: {results['import_total_ms']} ms "
+              f"(mcp {results['import_mcp_ms']} ms, own {results['import_own_ms']} ms, budget {args.budget_ms} ms)")
+        print(f"spawn to initialize response: {results['handshake_ms']} ms")
+        print(f"lazy modules loaded by add/consultation://: {results['lazy_modules_loaded'] or 'none'}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+Serves /openai/v1/chat/completions with a configurable latency
+distribution, streaming speed and injected failures (429s, 5xx and
+requests that never answer), so the consultant can be load tested
+without a network or an API key. GET /stats returns the server counters.
+
+    python benchmarks/mock_groq.py --port 8765 --latency lognormal:300:0.4 \\
+        --tokens 128 --tokens-per-second 400 --error-429-rate 0.02
+
+Answers start with "MOCK" so a client can tell them from template fallbacks.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+ANSWER_PREFIX = "MOCK"
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+    500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable",
+}
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution into a sampler returning seconds:
+    'fixed:MS', 'uniform:LOW_MS:HIGH_MS', 'exponential:MEAN_MS' or
+    'lognormal:MEDIAN_MS:SIGMA'.
+    """
+    kind, _, rest = spec.partition(":")
+    values = [float(v) for v in rest.split(":")] if rest else []
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1000 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0] / 1000)
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution {spec!r}")
+
+
+class MockGroqServer:
+    """Minimal asyncio HTTP/1.1 server imitating Groq chat completions."""
+
+    def __init__(self, latency="lognormal:300:0.4", tokens=64, tokens_per_second=400.0,
+                 error_429_rate=0.0, error_5xx_rate=0.0, timeout_rate=0.0,
+                 hang_seconds=300.0, retry_after=1.0, seed=None):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.server = None
+        self.counters = {"requests": 0, "streamed": 0, "timeouts": 0, "in_flight": 0, "max_in_flight": 0}
+        self.statuses = {}
+
+    def config(self):
+        return {
+            "latency": self.latency_spec,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "error_429_rate": self.error_429_rate,
+            "error_5xx_rate": self.error_5xx_rate,
+            "timeout_rate": self.timeout_rate,
+        }
+
+    def stats(self):
+        return dict(self.counters, statuses={str(k): v for k, v in sorted(self.statuses.items())})
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start listening and return the bound port."""
+        self.server = await asyncio.start_server(self._handle_connection, host, port, backlog=1024)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                await self._dispatch(method, path, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body, writer):
+        if method == "GET" and path == "/stats":
+            await self._respond(writer, 200, json.dumps(self.stats()).encode())
+            return
+        if method != "POST" or path != COMPLETIONS_PATH:
+            await self._respond(writer, 404, b'{"error": {"message": "not found"}}')
+            return
+
+        self.counters["requests"] += 1
+        self.counters["in_flight"] += 1
+        self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+        try:
+            await self._complete(json.loads(body), writer)
+        finally:
+            self.counters["in_flight"] -= 1
+
+    async def _complete(self, request, writer):
+        roll = self.rng.random()
+        if roll < self.timeout_rate:
+            # Accept the request and never answer; the client's deadline has to cut it off
+            self.counters["timeouts"] += 1
+            await asyncio.sleep(self.hang_seconds)
+            raise ConnectionError("hung request abandoned")
+        roll -= self.timeout_rate
+        if roll < self.error_429_rate:
+            await self._respond(writer, 429, b'{"error": {"message": "rate limited"}}',
+                                {"retry-after": f"{self.retry_after:g}"})
+            return
+        roll -= self.error_429_rate
+        if roll < self.error_5xx_rate:
+            await asyncio.sleep(self.sample_latency(self.rng) / 4)
+            await self._respond(writer, self.rng.choice((500, 502, 503)), b'{"error": {"message": "upstream failure"}}')
+            return
+
+        await asyncio.sleep(self.sample_latency(self.rng))
+        # Answers stop at the request's max_tokens, like the real API
+        tokens = min(self.tokens, request.get("max_tokens") or self.tokens)
+        finish_reason = "length" if tokens < self.tokens else "stop"
+        words = [f"tok{i}" for i in range(tokens)]
+        usage = {
+            "prompt_tokens": sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4,
+            "completion_tokens": tokens,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if request.get("stream"):
+            await self._stream(writer, request.get("model"), words, usage, finish_reason)
+            return
+        answer = " ".join([ANSWER_PREFIX] + words)
+        payload = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                         "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+        await self._respond(writer, 200, json.dumps(payload).encode())
+
+    async def _stream(self, writer, model, words, usage, finish_reason="stop"):
+        self.counters["streamed"] += 1
+        self._count(200)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n" + self._rate_limit_headers() + b"\r\n"
+        )
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        started = time.monotonic()
+        for i, word in enumerate([ANSWER_PREFIX] + words):
+            chunk = {"id": "chatcmpl-mock", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}}]}
+            self._write_chunk(writer, b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            # Pace against the start time so timer overshoot doesn't accumulate
+            delay = started + (i + 1) * interval - time.monotonic()
+            if delay > 0:
+                await writer.drain()
+                await asyncio.sleep(delay)
+        final = {"id": "chatcmpl-mock", "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "x_groq": {"usage": usage}}
+        self._write_chunk(writer, b"data: " + json.dumps(final).encode() + b"\n\n")
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer, data):
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _rate_limit_headers(self):
+        return (
+            b"x-ratelimit-remaining-requests: 14000\r\nx-ratelimit-reset-requests: 6s\r\n"
+            b"x-ratelimit-remaining-tokens: 1000000\r\nx-ratelimit-reset-tokens: 60ms\r\n"
+        )
+
+    def _count(self, status):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def _respond(self, writer, status, body, headers=None):
+        self._count(status)
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}",
+                "Content-Type: application/json", f"Content-Length: {len(body)}"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write("\r\n".join(head).encode() + b"\r\n" + self._rate_limit_headers() + b"\r\n" + body)
+        await writer.drain()
+
+
+def add_server_arguments(parser):
+    """Register the mock's knobs on an argparse parser (shared with bench_e2e)."""
+    parser.add_argument("--latency", default="lognormal:300:0.4",
+                        help="time to first byte distribution (fixed:MS, uniform:LO:HI, "
+                             "exponential:MEAN, lognormal:MEDIAN:SIGMA)")
+    parser.add_argument("--tokens", type=int, default=64, help="completion length in tokens")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="streaming speed")
+    parser.add_argument("--error-429-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--error-5xx-rate", type=float, default=0.0, help="fraction answered with 5xx")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction that never answer")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429s")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def server_from_args(args):
+    return MockGroqServer(
+        latency=args.latency, tokens=args.tokens, tokens_per_second=args.tokens_per_second,
+        error_429_rate=args.error_429_rate, error_5xx_rate=args.error_5xx_rate,
+        timeout_rate=args.timeout_rate, retry_after=args.retry_after, seed=args.seed,
+    )
+
+
+async def serve(args):
+    server = server_from_args(args)
+    port = await server.start(args.host, args.port)
+    print(f"Mock Groq listening on http://{args.host}:{port}{COMPLETIONS_PATH}", flush=True)
+    await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Groq chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    add_server_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
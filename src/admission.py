@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+from config import env_float, env_int, env_str
+from metrics import get_shared_metrics
+
+# Lower values are admitted first; "background" is for cache warming
+PRIORITIES = {"high": 0, "normal": 1, "low": 2, "background": 3}
+DEFAULT_PRIORITY = "normal"
+
+SHED_RESPONSES = ("template", "busy")
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a consultation is shed instead of queued: the queue is full
+    ("queue_full"), a higher priority call took its place ("displaced"), or
+    its queue wait would run past its deadline or the maximum wait ("queue_wait").
+    """
+
+    def __init__(self, reason, retry_after=None):
+        super().__init__(f"Consultation shed ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_priority(value):
+    """Return the priority name for value (None means normal); raises ValueError if unknown."""
+    if value is None:
+        return DEFAULT_PRIORITY
+    name = str(value).strip().lower()
+    if name not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    return name
+
+
+def parse_client_priorities(value):
+    """Parse CONSULTANT_CLIENT_PRIORITIES, e.g. 'claude-code=high,nightly-batch=low'."""
+    priorities = {}
+    for item in value.split(","):
+        client, _, priority = item.partition("=")
+        if client.strip() and priority.strip():
+            priorities[client.strip()] = parse_priority(priority)
+    return priorities
+
+
+class AdmissionController:
+    """
+    Bounded priority queue in front of upstream calls. At most
+    max_concurrency consultations talk to the model at once; the rest wait
+    in priority order (then arrival order) in a queue of at most max_queue
+    entries. A call is shed rather than queued when the queue is full and
+    nothing of lower priority can be displaced, or when its expected wait
+    (from the queue ahead of it and recent service times) would run past
+    its deadline or max_queue_wait. Queued calls that reach that limit are
+    shed too.
+    """
+
+    def __init__(self, max_concurrency=None, max_queue=None, max_queue_wait=None, shed_response=None):
+        """Initialize the controller; unset options are read from the environment."""
+        self.max_concurrency = (
+            max_concurrency if max_concurrency is not None else env_int("CONSULTANT_MAX_CONCURRENT_UPSTREAM", 32)
+        )
+        self.max_queue = max_queue if max_queue is not None else env_int("CONSULTANT_ADMISSION_QUEUE_SIZE", 256)
+        self.max_queue_wait = (
+            max_queue_wait if max_queue_wait is not None else env_float("CONSULTANT_MAX_QUEUE_WAIT", 10.0)
+        )
+        self.shed_response = shed_response or env_str("CONSULTANT_SHED_RESPONSE", "template")
+        if self.shed_response not in SHED_RESPONSES:
+            raise ValueError(f"CONSULTANT_SHED_RESPONSE must be one of {', '.join(SHED_RESPONSES)}")
+
+        self.metrics = get_shared_metrics()
+        self.active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        # Moving average of how long an admitted call holds its slot
+        self._service_time = None
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = {}
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def queue_depth(self, priority=None):
+        """Calls waiting for a slot, optionally only those of one priority."""
+        if priority is None:
+            return len(self._waiters)
+        rank = PRIORITIES[priority]
+        return sum(1 for entry in self._waiters if entry[0] == rank)
+
+    def expected_wait(self, ahead):
+        """Seconds a call with `ahead` calls queued before it can expect to wait."""
+        if self._service_time is None:
+            return 0.0
+        return (ahead + 1) * self._service_time / self.max_concurrency
+
+    def _shed(self, reason, retry_after=None):
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        self.metrics.admissions_shed.inc(reason=reason)
+        return AdmissionRejected(reason, retry_after)
+
+    def _grant(self, priority, waited):
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.metrics.queue_wait_seconds.observe(waited, priority=priority)
+
+    async def acquire(self, priority=DEFAULT_PRIORITY, deadline=None):
+        """
+        Wait for an upstream slot. deadline is a time.monotonic() timestamp;
+        raises AdmissionRejected if the call is shed instead.
+        """
+        if self.max_concurrency <= 0:
+            return
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self._grant(priority, 0.0)
+            return
+
+        now = time.monotonic()
+        limit = now + self.max_queue_wait
+        if deadline is not None:
+            limit = min(limit, deadline)
+        rank = PRIORITIES[priority]
+        ahead = sum(1 for entry in self._waiters if entry[0] <= rank)
+        expected = self.expected_wait(ahead)
+        if now + expected > limit:
+            raise self._shed("queue_wait", expected)
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if worst[0] <= rank:
+                raise self._shed("queue_full", expected)
+            # Make room by shedding the newest call of the lowest priority
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            worst[2].set_exception(self._shed("displaced", self.expected_wait(len(self._waiters))))
+
+        entry = (rank, next(self._sequence), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        future = entry[2]
+        try:
+            # Unlike wait_for, wait never swallows the caller's cancellation once the slot is granted
+            await asyncio.wait((future,), timeout=max(0.0, limit - now))
+        except BaseException:
+            # Cancelled by the caller: give back a slot that was already handed over
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            else:
+                self._discard(entry)
+            raise
+        if not future.done():
+            self._discard(entry)
+            raise self._shed("queue_wait", self.expected_wait(ahead))
+        # Raises AdmissionRejected if the call was displaced while queued
+        future.result()
+        self._grant(priority, time.monotonic() - now)
+
+    def _discard(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        if not entry[2].done():
+            entry[2].cancel()
+
+    def release(self, service_time=None):
+        """Free a slot, handing it straight to the next queued call if there is one."""
+        if self.max_concurrency <= 0:
+            return
+        if service_time is not None:
+            self._service_time = (
+                service_time if self._service_time is None else 0.8 * self._service_time + 0.2 * service_time
+            )
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority=DEFAULT_PRIORITY, deadline=None):
+        """Hold an upstream slot for the duration of the block."""
+        await self.acquire(priority, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def busy_message(self, retry_after=None):
+        """The short answer given to shed calls when CONSULTANT_SHED_RESPONSE=busy."""
+        retry = max(1, round(retry_after or self._service_time or 1.0))
+        return (
+            "The software engineering consultant is at capacity right now. "
+            f"Please retry in about {retry}s."
+        )
+
+    def stats(self):
+        """Return slot usage, queue depth by priority, wait times and shed counts."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queue_depth": {name: self.queue_depth(name) for name in PRIORITIES},
+            "max_queue_depth": self.max_queue_depth,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": dict(self.shed),
+            "shed_response": self.shed_response,
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_service_ms": round(self._service_time * 1000, 1) if self._service_time is not None else None,
+        }
+
+
+# Process-wide controller shared by every agent
+_shared_controller = None
+
+
+def get_shared_admission_controller():
+    """Return the shared admission controller."""
+    global _shared_controller
+    if _shared_controller is None:
+        _shared_controller = AdmissionController()
+    return _shared_controller
@@ -0,0 +1,101 @@
+import importlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from config import env_bool, env_float, env_int
+
+
+class AgentRegistry:
+    """
+    Process-wide registry of configured consultant agents.
+    Agents are keyed by (model, session_id) and reused across tool calls;
+    calls without a session share one stateless agent per model. Session
+    agents that sit idle longer than idle_ttl seconds are evicted.
+    Pass factory_loader instead of agent_factory to import the agent module
+    only when the first agent is needed.
+    """
+
+    def __init__(self, agent_factory=None, idle_ttl=None, max_agents=None, dev_reload=None, factory_loader=None):
+        """Initialize the registry; unset options are read from the environment."""
+        if agent_factory is None and factory_loader is None:
+            raise ValueError("AgentRegistry needs an agent_factory or a factory_loader")
+        self.agent_factory = agent_factory
+        self.factory_loader = factory_loader
+        self.idle_ttl = idle_ttl if idle_ttl is not None else env_float("CONSULTANT_AGENT_IDLE_TTL", 1800.0)
+        self.max_agents = max_agents if max_agents is not None else env_int("CONSULTANT_MAX_AGENTS", 1000)
+        # Hot reload is a dev-only mode; production calls never pay for it
+        self.dev_reload = dev_reload if dev_reload is not None else env_bool("CONSULTANT_DEV_RELOAD")
+
+        self._agents = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def get(self, model, session_id=None):
+        """Return the agent for a model/session, creating it on first use."""
+        if self.dev_reload:
+            self.reload()
+
+        key = (model, session_id)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= min(self.idle_ttl, 60.0):
+                self._evict_idle_locked(now)
+
+            entry = self._agents.get(key)
+            if entry is not None:
+                self._agents.move_to_end(key)
+                entry[1] = now
+                self.reused += 1
+                return entry[0]
+
+            if self.agent_factory is None:
+                self.agent_factory = self.factory_loader()
+            agent = self.agent_factory(model=model, stateful=session_id is not None, session_id=session_id)
+            self._agents[key] = [agent, now]
+            self.created += 1
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+                self.evicted += 1
+            return agent
+
+    def evict_idle(self):
+        """Drop agents that have been idle longer than idle_ttl. Returns the count."""
+        with self._lock:
+            return self._evict_idle_locked(time.monotonic())
+
+    def _evict_idle_locked(self, now):
+        self._last_sweep = now
+        expired = [key for key, (_, last_used) in self._agents.items()
+                   if now - last_used > self.idle_ttl]
+        for key in expired:
+            del self._agents[key]
+        self.evicted += len(expired)
+        return len(expired)
+
+    def reload(self):
+        """Reload the agent module and start over with fresh agents (dev mode)."""
+        module = sys.modules.get(self.agent_factory.__module__) if self.agent_factory is not None else None
+        if module is not None:
+            module = importlib.reload(module)
+            self.agent_factory = getattr(module, self.agent_factory.__name__)
+        self.clear()
+
+    def clear(self):
+        """Forget every registered agent."""
+        with self._lock:
+            self._agents.clear()
+
+    def stats(self):
+        """Return registry counters."""
+        with self._lock:
+            return {
+                "active_agents": len(self._agents),
+                "created": self.created,
+                "reused": self.reused,
+                "evicted": self.evicted,
+            }
@@ -1,27 +1,29 @@
+import asyncio
 import os
-import json
+import threading
 import urllib.request
 import urllib.error
 import urllib.parse
 import random
-
-# Try to import dotenv, but handle the case if it's not available
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    # Define a simple function to load environment variables from .env file
-    def load_dotenv():
-        try:
-            with open('.env', 'r') as env_file:
-                for line in env_file:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        key, value = line.split('=', 1)
-                        os.environ[key] = value
-        except Exception as e:
-            print(f"Warning: Could not load .env file: {str(e)}")
-    load_dotenv()
+import textwrap
+import time
+
+from config import env_str, load_env_file
+from groq_client import DEFAULT_API_URL, get_shared_client
+from endpoint_router import get_shared_router
+from response_cache import ResponseCache, get_shared_cache, hash_text
+from similarity_index import get_shared_index
+from history_manager import get_shared_history_manager
+from singleflight import get_shared_single_flight
+from fallback_engine import FALLBACK_ENGINE
+from generation_policy import LEGACY_POLICY, get_shared_generation_policy
+from session_store import get_shared_session_store
+from json_codec import BODY_ENCODER, loads
+from metrics import get_shared_metrics
+from admission import DEFAULT_PRIORITY, AdmissionRejected, get_shared_admission_controller
+
+# A no-op when mcpserver has already loaded it
+load_env_file()
 
 class SoftwareEngineerAgent:
     """
@@ -29,21 +31,28 @@ class SoftwareEngineerAgent:
     Specialized in providing expert technical guidance and advice for software engineering tasks.
     """
     
-    def __init__(self, model="qwen-2.5-coder-32b"):
-        """Initialize the Software Engineering Consultant ."""
+    def __init__(self, model="qwen-2.5-coder-32b", stateful=True, session_id=None):
+        """
+        Initialize the Software Engineering Consultant.
+        Stateless agents never record turns, so one instance can safely serve
+        concurrent one-shot consultations. Agents for a session_id keep their
+        history in the shared session store so any worker can continue it.
+        """
         self.model = model
+        self.stateful = stateful
+        self.session_id = session_id
         self.api_key = os.environ.get("GROQ_API_KEY", "")
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
+        self.api_url = env_str("GROQ_API_URL", DEFAULT_API_URL)
         
-        # Enhanced system prompt for expert consulting
-        self.system_prompt = """
+        # Enhanced system prompt for expert consulting, dedented so indentation isn't sent as tokens
+        self.system_prompt = textwrap.dedent("""
         You are an elite Senior Software Engineering Consultant working as Claude's technical advisor. You are NOT a code writer - you are a strategic technical consultant who provides expert guidance, analysis, and recommendations.
 
         Your role is to be the technical expert that Claude can consult for:
-        
+
         CORE EXPERTISE:
         - Software architecture assessment and recommendations
-        - Code quality evaluation and improvement strategies  
+        - Code quality evaluation and improvement strategies
         - Performance bottleneck identification and optimization approaches
         - Security vulnerability analysis and mitigation strategies
         - Technical debt assessment and refactoring recommendations
@@ -73,18 +82,45 @@ class SoftwareEngineerAgent:
         - Use professional consulting language appropriate for senior developers
 
         Remember: You advise and guide, you don't implement. You're the senior consultant they call when they need expert technical direction.
-        """
+        """).strip()
+        
+        self.system_prompt_hash = hash_text(self.system_prompt)
+        self.history_manager = get_shared_history_manager()
+        self.single_flight = get_shared_single_flight()
+        # Multi-endpoint routing when CONSULTANT_ENDPOINTS is configured, else api_url only
+        self.router = get_shared_router()
+        self.metrics = get_shared_metrics()
+        # max_tokens, temperature and model picked per query class
+        self.generation_policy = get_shared_generation_policy()
+        # Bounded priority queue in front of upstream calls
+        self.admission = get_shared_admission_controller()
+        self.session_version = 0
+        # Session loads and writes run in worker threads; one at a time per agent
+        self._session_lock = threading.Lock()
         
         # Initialize conversation history
         self.conversation_history = [
             {"role": "system", "content": self.system_prompt}
         ]
     
+    # The shared stores are looked up on each use, so one that failed to open
+    # (e.g. a locked SQLite file) is picked up once it can be opened
+    @property
+    def response_cache(self):
+        return get_shared_cache()
+    
+    @property
+    def similarity_index(self):
+        return get_shared_index(self.response_cache)
+    
+    @property
+    def session_store(self):
+        return get_shared_session_store() if self.session_id is not None else None
+    
     def _make_api_request(self, data):
         """Make an API request to Groq"""
         try:
-            data_str = json.dumps(data)
-            data_bytes = data_str.encode('utf-8')
+            data_bytes = BODY_ENCODER.encode(data)
             
             req = urllib.request.Request(self.api_url, method="POST")
             req.add_header('Content-Type', 'application/json')
@@ -92,312 +128,345 @@ class SoftwareEngineerAgent:
             req.add_header('User-Agent', 'MCP-Software-Engineer-Consultant/1.0')
             
             with urllib.request.urlopen(req, data=data_bytes, timeout=60) as response:
-                response_data = json.loads(response.read().decode('utf-8'))
+                response_data = loads(response.read())
                 return response_data
         except Exception as e:
             return {"error": str(e)}
     
-    def generate_response(self, query):
-        """Generate a consulting response to a software engineering query."""
+    async def _amake_api_request(self, data, on_delta=None, deadline=None):
+        """
+        Make a non-blocking API request to Groq over the shared connection pool.
+        When on_delta is given the completion is streamed and each partial chunk
+        of content is passed to it as it arrives. deadline is a time.monotonic()
+        timestamp the request (including retries) must finish by.
+        """
+        if self.router is not None:
+            return await self.router.request(data, on_delta, deadline)
+        client = get_shared_client(self.api_url)
+        if on_delta is not None:
+            return await client.stream_json(data, self.api_key, on_delta, deadline=deadline)
+        return await client.post_json(data, self.api_key, deadline=deadline)
+    
+    def _build_request_data(self, messages, policy=LEGACY_POLICY):
+        """Format the conversation for the Groq API (OpenAI-compatible) under a generation policy"""
+        return {
+            "model": policy.get("model") or self.model,
+            "messages": messages,
+            "temperature": policy["temperature"],
+            "max_tokens": policy["max_tokens"],
+            "top_p": 0.95,
+            "stream": False
+        }
+    
+    def _extract_content(self, response_data):
+        """Return the completion text from a Groq response, or None if unusable."""
+        if "error" in response_data:
+            return None
+        
+        # Parse Groq/OpenAI-compatible response
+        if (response_data.get("choices") and 
+            len(response_data["choices"]) > 0 and
+            response_data["choices"][0].get("message") and
+            response_data["choices"][0]["message"].get("content")):
+            return response_data["choices"][0]["message"]["content"]
+        return None
+    
+    def _record_usage(self, query_class, response_data):
+        """Record prompt and completion token usage for the history budget and the generation policy."""
+        usage = response_data.get("usage")
+        self.history_manager.record_usage(usage)
+        choices = response_data.get("choices") or [{}]
+        self.generation_policy.record(query_class, usage, choices[0].get("finish_reason"))
+    
+    def _sync_session(self):
+        """
+        Load the session's history on first use, and afterwards pick up turns
+        another worker added since we last saw it.
+        """
+        session_store = self.session_store
+        if session_store is None:
+            return
+        with self._session_lock:
+            messages, version = session_store.load(self.session_id, self.model, self.session_version)
+            if messages is not None:
+                self.conversation_history = self.conversation_history[:1] + messages
+            self.session_version = version
+    
+    def _remember(self, query, response_text):
+        """Record a completed turn, compacting the history to its token budget."""
+        if not self.stateful:
+            return
+        session_store = self.session_store
+        with self._session_lock:
+            self.conversation_history.append({"role": "user", "content": query})
+            self.conversation_history.append({"role": "assistant", "content": response_text})
+            length = len(self.conversation_history)
+            self.conversation_history = self.history_manager.compact(self.conversation_history)
+            if session_store is not None:
+                # Compaction only ever shortens the history; an unchanged length means nothing was dropped
+                if length == len(self.conversation_history):
+                    expected = self.session_version + 2
+                    version = session_store.append(
+                        self.session_id, self.model, self.conversation_history[-2:]
+                    )
+                    # Another worker added turns meanwhile: reload the interleaved history next time
+                    self.session_version = version if version == expected else 0
+                else:
+                    # The system prompt is the agent's own, not part of the stored session
+                    self.session_version = session_store.replace(
+                        self.session_id, self.model, self.conversation_history[1:]
+                    )
+    
+    async def _aload_session(self):
+        """_sync_session in a worker thread, keeping SQLite reads off the event loop."""
+        if self.session_id is not None:
+            await asyncio.to_thread(self._sync_session)
+    
+    async def _aremember(self, query, response_text):
+        """_remember, in a worker thread when the turn is written to the session store."""
+        if self.session_id is not None:
+            await asyncio.to_thread(self._remember, query, response_text)
+        else:
+            self._remember(query, response_text)
+    
+    def _cache_namespace(self, data):
+        """Return the response cache namespace for a request, or None if it can't be cached."""
+        # Later turns depend on the conversation so far; only fresh conversations are cached
+        if self.response_cache is None or len(self.conversation_history) > 1:
+            return None
+        return ResponseCache.make_namespace(
+            data["model"], data["temperature"], data["max_tokens"], self.system_prompt_hash
+        )
+    
+    def _cached_response(self, query, namespace, cache_key):
+        """
+        Look up an exact cache hit, then a near-duplicate prompt's answer.
+        Returns (response, source) with source "cache" or "similar", or (None, None).
+        """
+        response_cache = self.response_cache
+        if response_cache is None:
+            return None, None
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            self.metrics.cache_lookups.inc(result="hit")
+            return cached, "cache"
+        similarity_index = self.similarity_index
+        match = similarity_index.lookup(query, namespace) if similarity_index is not None else None
+        if match is not None:
+            cached = response_cache.get(match["cache_key"])
+            if cached is not None:
+                self.metrics.cache_lookups.inc(result="similar")
+                return cached, "similar"
+            # The matched answer expired from the cache
+            similarity_index.remove(match["cache_key"])
+        self.metrics.cache_lookups.inc(result="miss")
+        return None, None
+    
+    def _store_response(self, query, namespace, cache_key, response_text):
+        response_cache = self.response_cache
+        if response_cache is None:
+            return
+        response_cache.put(cache_key, query, response_text, namespace)
+        similarity_index = self.similarity_index
+        if similarity_index is not None:
+            similarity_index.add(query, namespace, cache_key)
+    
+    def generate_response(self, query, bypass_cache=False):
+        """
+        Generate a consulting response to a software engineering query.
+        With bypass_cache the cached answer is ignored and replaced by a fresh one.
+        """
         if not self.api_key:
             return self._generate_fallback_response(query)
         
-        # Add query to conversation history
-        self.conversation_history.append({"role": "user", "content": query})
+        self._sync_session()
+        query_class, policy = self.generation_policy.select(query)
+        messages = self.history_manager.build_messages(self.conversation_history, query)
+        data = self._build_request_data(messages, policy)
+        namespace = self._cache_namespace(data)
+        cache_key = ResponseCache.make_key(query, namespace) if namespace else None
+        
+        if cache_key and not bypass_cache:
+            cached, _ = self._cached_response(query, namespace, cache_key)
+            if cached is not None:
+                self._remember(query, cached)
+                return cached
         
         try:
-            # Format for Groq API (OpenAI-compatible)
-            data = {
-                "model": self.model,
-                "messages": self.conversation_history,
-                "temperature": 0.3,
-                "max_tokens": 2048,
-                "top_p": 0.95,
-                "stream": False
-            }
-            
             response_data = self._make_api_request(data)
-            
-            if "error" in response_data:
-                return self._generate_fallback_response(query)
-            
-            # Parse Groq/OpenAI-compatible response
-            if (response_data.get("choices") and 
-                len(response_data["choices"]) > 0 and
-                response_data["choices"][0].get("message") and
-                response_data["choices"][0]["message"].get("content")):
-                
-                response_text = response_data["choices"][0]["message"]["content"]
-                self.conversation_history.append({"role": "assistant", "content": response_text})
-                return response_text
-            else:
+            self._record_usage(query_class, response_data)
+            response_text = self._extract_content(response_data)
+            if response_text is None:
                 return self._generate_fallback_response(query)
-                
+            if cache_key:
+                self._store_response(query, namespace, cache_key, response_text)
+            self._remember(query, response_text)
+            return response_text
         except Exception as e:
             return self._generate_fallback_response(query)
     
+    async def _afetch(self, query, query_class, data, namespace, cache_key, flight):
+        """
+        Fetch a completion from Groq once admitted, and cache a usable answer.
+        flight (see singleflight.Flight) carries the priority and deadline of
+        the callers sharing the fetch and fans partial answers out to them.
+        """
+        async with self.admission.slot(flight.priority, flight.deadline):
+            on_delta = flight.broadcast if flight.streaming else None
+            response_data = await self._amake_api_request(data, on_delta, flight.deadline)
+        self._record_usage(query_class, response_data)
+        response_text = self._extract_content(response_data)
+        if cache_key and response_text is not None:
+            # SQLite writes run in a worker thread so they don't stall other consultations
+            await asyncio.to_thread(self._store_response, query, namespace, cache_key, response_text)
+        return response_data
+    
+    async def aconsult(self, query, bypass_cache=False, on_delta=None, deadline=None, priority=DEFAULT_PRIORITY):
+        """
+        Produce a consulting response without blocking the event loop.
+        Returns {"response": text, "source": ...} where source is "upstream",
+        "cache", "similar" (near-duplicate prompt) or "fallback" (template).
+        Fallbacks carry a "fallback_reason"; upstream answers carry the request's
+        stage "timings" in milliseconds.
+        Pass an async on_delta(text) callback to stream the answer as it is generated.
+        Concurrent identical cacheable queries share a single upstream call,
+        which streams to each of them and runs until the last one's deadline.
+        deadline (a time.monotonic() timestamp) bounds this caller's wait and
+        the upstream request.
+        Calls that reach the upstream queue for a slot by priority ("high",
+        "normal", "low"); shed calls get the template, or a short "busy"
+        answer (source "busy") with CONSULTANT_SHED_RESPONSE=busy.
+        """
+        if not self.api_key and self.router is None:
+            return self._fallback_result(query, "no_api_key")
+        
+        await self._aload_session()
+        query_class, policy = self.generation_policy.select(query)
+        messages = self.history_manager.build_messages(self.conversation_history, query)
+        data = self._build_request_data(messages, policy)
+        namespace = self._cache_namespace(data)
+        cache_key = ResponseCache.make_key(query, namespace) if namespace else None
+        
+        if cache_key and not bypass_cache:
+            cached, source = await asyncio.to_thread(self._cached_response, query, namespace, cache_key)
+            if cached is not None:
+                await self._aremember(query, cached)
+                return {"response": cached, "source": source}
+        
+        try:
+            fetch = lambda flight: self._afetch(query, query_class, data, namespace, cache_key, flight)
+            if cache_key:
+                shared = self.single_flight.do(cache_key, fetch, on_delta, deadline, priority)
+            else:
+                shared = self.single_flight.run(fetch, on_delta, deadline, priority)
+            if deadline is not None:
+                # A shared fetch may run on for other callers; this one stops waiting at its own deadline
+                response_data = await asyncio.wait_for(shared, timeout=max(0.0, deadline - time.monotonic()))
+            else:
+                response_data = await shared
+            response_text = self._extract_content(response_data)
+            if response_text is None:
+                return self._fallback_result(query, self._failure_reason(response_data))
+            await self._aremember(query, response_text)
+            # Coalesced callers share response_data, so hand each one its own copy
+            return {"response": response_text, "source": "upstream",
+                    "timings": dict(response_data.get("timings") or {})}
+        except AdmissionRejected as e:
+            if self.admission.shed_response == "busy":
+                return {"response": self.admission.busy_message(e.retry_after), "source": "busy",
+                        "shed_reason": e.reason}
+            return self._fallback_result(query, e.reason)
+        except asyncio.TimeoutError:
+            return self._fallback_result(query, "deadline")
+        except Exception as e:
+            return self._fallback_result(query, "exception")
+    
+    async def awarm(self, query, priority="background"):
+        """
+        Fetch and cache the answer to query as a fresh conversation would ask it,
+        unless it is already cached. Returns "cached", "warmed", "shed" or "failed".
+        """
+        response_cache = self.response_cache
+        if response_cache is None or (not self.api_key and self.router is None):
+            return "failed"
+        query_class, policy = self.generation_policy.select(query)
+        messages = [self.conversation_history[0], {"role": "user", "content": query}]
+        data = self._build_request_data(messages, policy)
+        namespace = ResponseCache.make_namespace(
+            data["model"], data["temperature"], data["max_tokens"], self.system_prompt_hash
+        )
+        cache_key = ResponseCache.make_key(query, namespace)
+        if await asyncio.to_thread(response_cache.contains, cache_key):
+            return "cached"
+        try:
+            response_data = await self.single_flight.do(
+                cache_key, lambda flight: self._afetch(query, query_class, data, namespace, cache_key, flight),
+                priority=priority,
+            )
+        except AdmissionRejected:
+            return "shed"
+        except Exception:
+            return "failed"
+        return "warmed" if self._extract_content(response_data) is not None else "failed"
+    
+    async def agenerate_response(self, query, bypass_cache=False, on_delta=None, deadline=None,
+                                 priority=DEFAULT_PRIORITY):
+        """Async variant of generate_response that doesn't block the event loop."""
+        result = await self.aconsult(query, bypass_cache=bypass_cache, on_delta=on_delta, deadline=deadline,
+                                     priority=priority)
+        return result["response"]
+    
     def _generate_fallback_response(self, query):
         """Generate a fallback consulting response when API is unavailable."""
-        query_lower = query.lower()
-        
-        if any(word in query_lower for word in ['review', 'analyze', 'assessment']):
-            return self._code_review_consulting_template(query)
-        elif any(word in query_lower for word in ['optimize', 'performance', 'slow', 'bottleneck']):
-            return self._optimization_consulting_template(query)
-        elif any(word in query_lower for word in ['architecture', 'design', 'structure', 'system']):
-            return self._architecture_consulting_template(query)
-        elif any(word in query_lower for word in ['debug', 'error', 'bug', 'issue', 'problem']):
-            return self._debugging_consulting_template(query)
-        elif any(word in query_lower for word in ['security', 'vulnerability', 'secure']):
-            return self._security_consulting_template(query)
-        else:
-            return self._general_consulting_template(query)
+        return FALLBACK_ENGINE.respond(query)
+    
+    def _fallback_result(self, query, reason):
+        """Render the template answer for query, timing the render."""
+        started = time.perf_counter()
+        response_text = self._generate_fallback_response(query)
+        elapsed = time.perf_counter() - started
+        self.metrics.observe_stage("fallback_render", elapsed)
+        return {"response": response_text, "source": "fallback", "fallback_reason": reason,
+                "timings": {"fallback_render_ms": elapsed * 1000}}
+    
+    @staticmethod
+    def _failure_reason(response_data):
+        """Classify why an upstream response couldn't be used."""
+        if response_data.get("circuit_open"):
+            return "circuit_open"
+        if response_data.get("deadline_exceeded"):
+            return "deadline"
+        if response_data.get("status") == 429:
+            return "rate_limited"
+        if "error" in response_data:
+            return "upstream_error"
+        return "empty_response"
     
     def _code_review_consulting_template(self, query):
-        return f"""
-# Strategic Code Quality Assessment
-
-## Consultation Summary for: "{query}"
-
-### Key Quality Indicators to Evaluate:
-- **Code Organization**: Assess module structure, separation of concerns, and logical grouping
-- **Maintainability**: Evaluate readability, documentation quality, and future modification ease
-- **Reliability**: Review error handling patterns, edge case coverage, and failure modes
-- **Performance Considerations**: Identify algorithmic efficiency and resource utilization patterns
-
-### Recommended Assessment Framework:
-1. **Structural Analysis**
-   - Review architectural patterns and design principles compliance
-   - Assess dependency management and coupling levels
-   - Evaluate abstraction layers and interface design
-
-2. **Quality Metrics Evaluation**
-   - Cyclomatic complexity assessment for maintainability
-   - Test coverage analysis for reliability confidence
-   - Technical debt identification and prioritization
-
-3. **Strategic Recommendations**
-   - Prioritize improvements based on business impact and technical risk
-   - Establish code quality gates for future development
-   - Implement automated quality assurance processes
-
-### Next Steps:
-Focus your review on areas with highest business risk and technical complexity. Consider implementing peer review processes and automated quality checks to maintain standards consistently.
-
-**Consultation Recommendation**: Establish measurable quality metrics before implementing improvements to track progress effectively.
-"""
+        return FALLBACK_ENGINE.render("code_review", query)
     
     def _optimization_consulting_template(self, query):
-        return f"""
-# Performance Optimization Strategy
-
-## Strategic Analysis for: "{query}"
-
-### Performance Assessment Framework:
-- **Bottleneck Identification**: Systematic profiling to locate actual vs. perceived performance issues
-- **Scalability Analysis**: Current capacity limits and growth trajectory planning
-- **Resource Utilization**: CPU, memory, I/O, and network efficiency evaluation
-- **User Experience Impact**: Performance effects on business metrics and user satisfaction
-
-### Optimization Strategy Recommendations:
-1. **Measurement First Approach**
-   - Establish baseline performance metrics before optimization
-   - Implement comprehensive monitoring and alerting systems
-   - Define performance SLAs aligned with business requirements
-
-2. **Systematic Optimization Priorities**
-   - **High Impact, Low Effort**: Quick wins for immediate improvement
-   - **Algorithmic Optimization**: Core logic efficiency improvements
-   - **Infrastructure Scaling**: Horizontal vs. vertical scaling decisions
-   - **Caching Strategies**: Multi-level caching implementation planning
-
-3. **Long-term Performance Strategy**
-   - Performance budgets and continuous monitoring
-   - Capacity planning for anticipated growth
-   - Performance regression prevention processes
-
-### Risk Considerations:
-- Premature optimization can introduce complexity without meaningful benefits
-- Balance optimization efforts with development velocity and maintainability
-- Consider cost implications of performance improvements vs. business value
-
-**Strategic Recommendation**: Focus optimization efforts on measured bottlenecks that directly impact user experience or operational costs.
-"""
+        return FALLBACK_ENGINE.render("optimization", query)
     
     def _architecture_consulting_template(self, query):
-        return f"""
-# Software Architecture Strategy Consultation
-
-## Strategic Analysis for: "{query}"
-
-### Architecture Assessment Framework:
-- **Current State Analysis**: Existing system capabilities, limitations, and technical debt
-- **Future Requirements**: Scalability needs, feature roadmap, and business growth plans
-- **Technology Landscape**: Platform capabilities, ecosystem integration, and vendor considerations
-- **Risk Assessment**: Technical risks, operational complexity, and migration challenges
-
-### Architectural Strategy Recommendations:
-1. **Design Principles Alignment**
-   - **Modularity**: Component independence and interface design clarity
-   - **Scalability**: Horizontal scaling capabilities and resource optimization
-   - **Reliability**: Fault tolerance, recovery mechanisms, and operational resilience
-   - **Maintainability**: Code organization, documentation, and team knowledge transfer
-
-2. **Technology Selection Criteria**
-   - Team expertise and learning curve considerations
-   - Community support and long-term technology viability
-   - Integration capabilities with existing systems
-   - Performance characteristics matching business requirements
-
-3. **Implementation Strategy**
-   - Phased migration approach minimizing business disruption
-   - Risk mitigation through proof-of-concept validation
-   - Team training and knowledge transfer planning
-   - Success metrics and milestone definition
-
-### Strategic Considerations:
-- Architecture decisions have long-term implications for team productivity and system maintainability
-- Balance technical excellence with business delivery timelines
-- Consider operational overhead of architectural complexity
-
-**Strategic Recommendation**: Prioritize architectural decisions that provide clear business value while maintaining technical sustainability for your team's capabilities.
-"""
+        return FALLBACK_ENGINE.render("architecture", query)
     
     def _debugging_consulting_template(self, query):
-        return f"""
-# Systematic Debugging Strategy Consultation
-
-## Problem Analysis for: "{query}"
-
-### Strategic Debugging Framework:
-- **Problem Classification**: Systematic vs. intermittent issues, environmental vs. code-related
-- **Impact Assessment**: Business impact, user experience effects, and operational risks
-- **Root Cause Analysis**: Systematic investigation approach to identify underlying causes
-- **Resolution Strategy**: Short-term fixes vs. long-term architectural improvements
-
-### Recommended Investigation Approach:
-1. **Systematic Problem Isolation**
-   - Reproduce issues in controlled environments
-   - Eliminate variables through methodical testing
-   - Document findings and investigation steps for team knowledge
-
-2. **Diagnostic Strategy**
-   - Implement comprehensive logging and monitoring
-   - Use profiling tools appropriate for your technology stack
-   - Leverage observability platforms for distributed system issues
-
-3. **Resolution Planning**
-   - **Immediate Fixes**: Minimal changes to restore functionality
-   - **Comprehensive Solutions**: Address root causes and prevent recurrence
-   - **Process Improvements**: Enhance development practices to prevent similar issues
-
-### Long-term Improvement Strategy:
-- Implement automated testing to catch issues earlier in development
-- Establish error monitoring and alerting for proactive issue detection
-- Create debugging runbooks for common problem patterns
-- Foster team debugging skills through knowledge sharing
-
-### Risk Management:
-- Balance quick fixes with sustainable long-term solutions
-- Consider testing and deployment risks when implementing fixes
-- Plan rollback strategies for production deployments
-
-**Strategic Recommendation**: Focus on understanding the problem thoroughly before implementing solutions. Quick fixes should be followed by comprehensive analysis to prevent recurrence.
-"""
+        return FALLBACK_ENGINE.render("debugging", query)
     
     def _security_consulting_template(self, query):
-        return f"""
-# Security Strategy Consultation
-
-## Security Assessment for: "{query}"
-
-### Security Framework Analysis:
-- **Threat Landscape**: Current security risks specific to your application and industry
-- **Attack Surface**: Entry points, data flows, and vulnerability exposure areas
-- **Compliance Requirements**: Industry standards, regulatory requirements, and organizational policies
-- **Risk Tolerance**: Business risk acceptance levels and security investment priorities
-
-### Strategic Security Recommendations:
-1. **Security by Design Principles**
-   - **Defense in Depth**: Multi-layered security controls and redundancy
-   - **Least Privilege**: Minimal access rights and permission management
-   - **Fail Secure**: System behavior during security failures and edge cases
-   - **Security Transparency**: Audit trails and security event monitoring
-
-2. **Implementation Priority Framework**
-   - **Critical Vulnerabilities**: Immediate threats requiring urgent attention
-   - **High-Impact Improvements**: Significant risk reduction with reasonable effort
-   - **Compliance Requirements**: Mandatory security controls and audit requirements
-   - **Proactive Measures**: Future-focused security enhancements
-
-3. **Operational Security Strategy**
-   - Regular security assessments and penetration testing
-   - Security awareness training for development teams
-   - Incident response planning and team preparation
-   - Security metrics and continuous improvement processes
-
-### Technology Security Considerations:
-- Secure coding practices and vulnerability prevention
-- Third-party dependency security management
-- Infrastructure security and deployment pipeline protection
-- Data protection and privacy compliance strategies
-
-**Strategic Recommendation**: Implement security controls based on actual risk assessment rather than generic security checklists. Focus on protecting your most valuable assets and critical business functions.
-"""
+        return FALLBACK_ENGINE.render("security", query)
     
     def _general_consulting_template(self, query):
-        return f"""
-# Software Engineering Strategic Consultation
-
-## Strategic Analysis for: "{query}"
-
-### Engineering Excellence Framework:
-- **Technical Strategy**: Alignment between technology choices and business objectives
-- **Team Productivity**: Development processes, tooling, and collaboration effectiveness
-- **Quality Assurance**: Testing strategies, code quality, and reliability measures
-- **Operational Excellence**: Deployment, monitoring, and incident management capabilities
-
-### Recommended Strategic Approach:
-1. **Current State Assessment**
-   - Evaluate existing technical capabilities and limitations
-   - Identify team strengths and skill development opportunities
-   - Assess process effectiveness and improvement areas
-   - Review technology stack alignment with business goals
-
-2. **Strategic Planning**
-   - **Short-term Improvements**: Quick wins for immediate productivity gains
-   - **Medium-term Investments**: Capability building and process optimization
-   - **Long-term Vision**: Technology roadmap and architectural evolution
-   - **Risk Mitigation**: Technical debt management and knowledge transfer
-
-3. **Implementation Excellence**
-   - Prioritize improvements based on business impact and technical feasibility
-   - Establish success metrics and progress tracking mechanisms
-   - Plan team training and knowledge transfer strategies
-   - Create sustainable development practices and quality standards
-
-### Key Strategic Considerations:
-- Balance technical excellence with business delivery requirements
-- Consider team capacity and skill development when planning improvements
-- Align technical decisions with business strategy and growth plans
-- Invest in sustainable practices that support long-term success
-
-### Success Metrics:
-- Team productivity and development velocity
-- Code quality and defect reduction rates
-- System reliability and performance metrics
-- Business feature delivery and time-to-market
-
-**Strategic Recommendation**: Focus on building sustainable engineering practices that support both current business needs and future growth. Prioritize improvements that enhance team capability and system reliability.
-"""
+        return FALLBACK_ENGINE.render("general", query)
 
 # For backward compatibility, create a simple template agent class
 class TemplateSoftwareEngineerAgent:
     """Fallback agent with enhanced consulting templates."""
     
     def generate_response(self, query):
-        agent = SoftwareEngineerAgent()
-        return agent._generate_fallback_response(query)
+        # The templates don't depend on agent state, so no agent is needed
+        return FALLBACK_ENGINE.respond(query)
     
     def debug_api_key(self, api_key):
         if not api_key or len(api_key) < 20:
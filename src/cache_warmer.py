@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from admission import get_shared_admission_controller
+from config import env_bool, env_float, env_int, env_str
+from endpoint_router import get_shared_router
+from groq_client import shared_clients
+from response_cache import get_shared_cache, normalize_prompt
+
+# fcntl is Unix-only; elsewhere every worker warms
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Corpus source reading the prompts already stored in the response cache
+CACHE_SOURCE = "cache"
+
+
+def load_corpus(path):
+    """
+    Read warming prompts from a JSONL file: one JSON string, or an object
+    with a "prompt" field, per line. Returns (prompts, skipped_lines).
+    """
+    prompts, skipped = [], 0
+    with open(path, "r", encoding="utf-8") as corpus:
+        for line in corpus:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            prompt = item.get("prompt") if isinstance(item, dict) else item
+            if isinstance(prompt, str) and prompt.strip():
+                prompts.append(prompt)
+            else:
+                skipped += 1
+    return prompts, skipped
+
+
+def upstream_headroom():
+    """Requests any upstream could send right now without queueing behind rate limits."""
+    schedulers = [client.scheduler for client in shared_clients()]
+    router = get_shared_router()
+    if router is not None:
+        schedulers += [endpoint.client.scheduler for endpoint in router.endpoints]
+    if not schedulers:
+        # Nothing has connected yet, so nothing is being throttled
+        return float("inf")
+    return max(scheduler.headroom() for scheduler in schedulers)
+
+
+class CacheWarmer:
+    """
+    Pre-populates the response cache from a corpus of common prompts so a
+    fresh deploy doesn't send its first hour of traffic to the model. The
+    corpus is a JSONL file, or "cache" for the prompts the response cache
+    already holds (most recently used first), which re-fetches answers that
+    expired or were stored under different generation settings.
+
+    Prompts are answered one at a time, at most rate_per_minute, as
+    "background" priority calls. Warming pauses while foreground calls are
+    queued or hold more than busy_fraction of the upstream slots, and while
+    the rate limiter has fewer than reserve requests to spare.
+    """
+
+    def __init__(self, agent, corpus=None, rate_per_minute=None, interval=None, max_prompts=None,
+                 reserve=None, busy_fraction=0.5):
+        """Initialize the warmer; unset options are read from the environment."""
+        self.agent = agent
+        self.corpus = corpus if corpus is not None else env_str("CONSULTANT_WARM_CORPUS", CACHE_SOURCE)
+        self.rate_per_minute = (
+            rate_per_minute if rate_per_minute is not None else env_float("CONSULTANT_WARM_RPM", 10.0)
+        )
+        self.interval = interval if interval is not None else env_float("CONSULTANT_WARM_INTERVAL", 0.0)
+        self.max_prompts = max_prompts if max_prompts is not None else env_int("CONSULTANT_WARM_MAX_PROMPTS", 500)
+        self.reserve = reserve if reserve is not None else env_int("CONSULTANT_WARM_RESERVE", 5)
+        self.busy_fraction = busy_fraction
+        self.admission = get_shared_admission_controller()
+
+        self.state = "idle"
+        self.runs = 0
+        self.total = 0
+        self.done = 0
+        self.results = {}
+        self.skipped_lines = 0
+        self.run_started_at = None
+        self.last_run_s = None
+        self.next_run_at = None
+
+    def prompts(self):
+        """Return the corpus prompts to warm, deduplicated, at most max_prompts."""
+        if self.corpus == CACHE_SOURCE:
+            cache = get_shared_cache()
+            rows = cache.iter_prompts(include_expired=True) if cache is not None else []
+            prompts = [prompt for _, _, prompt in rows]
+        else:
+            prompts, self.skipped_lines = load_corpus(self.corpus)
+        unique, seen = [], set()
+        for prompt in prompts:
+            normalized = normalize_prompt(prompt)
+            if normalized not in seen:
+                seen.add(normalized)
+                unique.append(prompt)
+        return unique[:self.max_prompts]
+
+    def _foreground_busy(self):
+        admission = self.admission
+        if admission.queue_depth():
+            return True
+        if admission.max_concurrency > 0 and admission.active >= admission.max_concurrency * self.busy_fraction:
+            return True
+        return upstream_headroom() <= self.reserve
+
+    async def run_once(self):
+        """Warm every corpus prompt once. Returns the per-result counts."""
+        # Reading the corpus (a file, or up to every cached prompt) is blocking I/O
+        prompts = await asyncio.to_thread(self.prompts)
+        self.state = "running"
+        self.runs += 1
+        self.total, self.done, self.results = len(prompts), 0, {}
+        self.run_started_at = time.time()
+        logger.info("Cache warming started: %d prompts from %s", self.total, self.corpus)
+        spacing = 60.0 / self.rate_per_minute if self.rate_per_minute > 0 else 0.0
+        report_every = max(1, self.total // 10)
+        for prompt in prompts:
+            while self._foreground_busy():
+                self.state = "paused"
+                await asyncio.sleep(1.0)
+            self.state = "running"
+            started = time.monotonic()
+            result = await self.agent.awarm(prompt)
+            self.results[result] = self.results.get(result, 0) + 1
+            self.done += 1
+            if self.done % report_every == 0 or self.done == self.total:
+                logger.info("Cache warming: %d/%d prompts (%s)", self.done, self.total, dict(self.results))
+            if result == "shed":
+                # The upstream is saturated; back off for longer than the pacing interval
+                await asyncio.sleep(max(spacing, 5.0))
+            elif result != "cached":
+                await asyncio.sleep(max(0.0, spacing - (time.monotonic() - started)))
+        self.last_run_s = round(time.time() - self.run_started_at, 1)
+        self.state = "idle"
+        return dict(self.results)
+
+    async def run(self):
+        """Warm now, then again every interval seconds when one is configured."""
+        try:
+            while True:
+                try:
+                    await self.run_once()
+                except (OSError, ValueError) as e:
+                    logger.warning("Cache warming failed: %s", e)
+                    self.state = "failed"
+                if self.interval <= 0:
+                    return
+                self.next_run_at = time.time() + self.interval
+                await asyncio.sleep(self.interval)
+        finally:
+            self.next_run_at = None
+            if self.state in ("running", "paused"):
+                self.state = "stopped"
+
+    def stats(self):
+        """Return warming progress."""
+        return {
+            "state": self.state,
+            "corpus": self.corpus,
+            "runs": self.runs,
+            "progress": f"{self.done}/{self.total}",
+            "results": dict(self.results),
+            "skipped_lines": self.skipped_lines,
+            "rate_per_minute": self.rate_per_minute,
+            "last_run_s": self.last_run_s,
+            "next_run_in_s": round(max(0.0, self.next_run_at - time.time()), 1) if self.next_run_at else None,
+        }
+
+
+def acquire_warming_lock(path):
+    """
+    Take an exclusive lock on path without blocking, so only one of several
+    worker processes warms a shared cache. Returns the open lock file (keep
+    it open while warming), or None if another process holds the lock.
+    """
+    if fcntl is None or path is None:
+        return open(os.devnull, "w")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    lock_file = open(path, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def start_cache_warming(agent):
+    """
+    Start background warming when CONSULTANT_WARM_ON_STARTUP is set and the
+    response cache is enabled. Returns (warmer, task), or (None, None) when
+    warming is off or another worker process is already doing it.
+    """
+    if not env_bool("CONSULTANT_WARM_ON_STARTUP"):
+        return None, None
+    cache = get_shared_cache()
+    if cache is None:
+        logger.warning("CONSULTANT_WARM_ON_STARTUP is set but the response cache is disabled")
+        return None, None
+    # An in-memory cache belongs to this process alone
+    lock_path = cache.path + ".warm.lock" if cache.path != ":memory:" else None
+    lock_file = acquire_warming_lock(lock_path)
+    if lock_file is None:
+        logger.info("Cache warming is running in another worker")
+        return None, None
+    warmer = CacheWarmer(agent)
+    task = asyncio.ensure_future(warmer.run())
+    task.add_done_callback(lambda _: lock_file.close())
+    return warmer, task
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from config import env_float, env_int
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream endpoint.
+    After failure_threshold consecutive failures or timeouts the circuit
+    opens and requests are refused immediately, so callers serve their
+    fallback without waiting on a dead upstream. After reset_timeout seconds
+    a single probe is let through (half-open); its success closes the
+    circuit again, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        """Initialize the breaker; unset options are read from the environment."""
+        self.failure_threshold = (
+            failure_threshold if failure_threshold is not None
+            else env_int("CONSULTANT_BREAKER_FAILURES", 5)
+        )
+        self.reset_timeout = (
+            reset_timeout if reset_timeout is not None
+            else env_float("CONSULTANT_BREAKER_RESET_TIMEOUT", 30.0)
+        )
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def is_open(self):
+        """Return True while the circuit refuses requests (no probe due yet)."""
+        with self._lock:
+            return self._state == OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def allow_request(self):
+        """Return True if a request may go upstream now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Give back a half-open probe slot whose request was abandoned."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self):
+        """Return the circuit state and counters."""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+            }
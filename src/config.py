@@ -0,0 +1,66 @@
+import os
+
+
+def env_str(name, default=""):
+    """Read a string setting from the environment."""
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    """Read an integer setting from the environment, falling back on bad values."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def env_float(name, default):
+    """Read a float setting from the environment, falling back on bad values."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def env_bool(name, default=False):
+    """Read a boolean flag from the environment (1/true/yes/on)."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+_env_file_loaded = False
+
+
+def load_env_file():
+    """
+    Load settings from a .env file into the environment, once per process;
+    variables that are already set win. Uses python-dotenv when installed.
+    """
+    global _env_file_loaded
+    if _env_file_loaded:
+        return
+    _env_file_loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        load_dotenv = None
+    if load_dotenv is not None:
+        load_dotenv()
+        return
+    try:
+        with open(".env", "r") as env_file:
+            for line in env_file:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    key, value = line.split("=", 1)
+                    os.environ.setdefault(key.strip(), value.strip())
+    except OSError:
+        pass
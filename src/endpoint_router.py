@@ -0,0 +1,265 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from config import env_bool, env_float, env_int, env_str
+from groq_client import AsyncGroqClient
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible upstream (URL, key and model) with its own connection
+    pool, rate-limit scheduler and circuit breaker. Tracks an EWMA of latency
+    and error rate plus a window of recent latencies for its p95. Latency is
+    time until the answer starts arriving: time to first token when
+    streaming, the whole request otherwise.
+    """
+
+    def __init__(self, name, api_url, api_key, model, alpha=None, window=200):
+        self.name = name
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.alpha = alpha if alpha is not None else env_float("CONSULTANT_ROUTER_EWMA_ALPHA", 0.2)
+        self.client = AsyncGroqClient(api_url)
+        self.ewma_latency_ms = None
+        self.ewma_error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=window)
+
+    @property
+    def available(self):
+        return bool(self.api_key) and not self.client.breaker.is_open()
+
+    def score(self):
+        """Lower is better. Unmeasured endpoints score 0 so each gets tried."""
+        if self.ewma_latency_ms is None:
+            return 0.0
+        return self.ewma_latency_ms * (1 + 4 * self.ewma_error_rate)
+
+    def p95_ms(self, min_samples=20):
+        """p95 latency over the recent window, or None with too few samples."""
+        if len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def record(self, latency_ms, ok):
+        self.requests += 1
+        self.ewma_error_rate += self.alpha * ((0.0 if ok else 1.0) - self.ewma_error_rate)
+        if not ok:
+            self.errors += 1
+            return
+        self._latencies.append(latency_ms)
+        if self.ewma_latency_ms is None:
+            self.ewma_latency_ms = latency_ms
+        else:
+            self.ewma_latency_ms += self.alpha * (latency_ms - self.ewma_latency_ms)
+
+    async def request(self, data, on_delta=None, deadline=None):
+        """Send the request to this endpoint (with its own model) and record the outcome."""
+        data = dict(data, model=self.model)
+        started = time.perf_counter()
+        if on_delta is not None:
+            response_data = await self.client.stream_json(data, self.api_key, on_delta, deadline=deadline)
+            latency_ms = (response_data.get("timings") or {}).get("ttft_ms")
+        else:
+            response_data = await self.client.post_json(data, self.api_key, deadline=deadline)
+            latency_ms = None
+        if latency_ms is None:
+            latency_ms = (time.perf_counter() - started) * 1000
+        # A refusal by our own circuit breaker says nothing new about the endpoint
+        if not response_data.get("circuit_open"):
+            self.record(latency_ms, "error" not in response_data)
+        response_data["endpoint"] = self.name
+        return response_data
+
+    def stats(self):
+        p95 = self.p95_ms()
+        return {
+            "name": self.name,
+            "model": self.model,
+            "available": self.available,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ewma_latency_ms": round(self.ewma_latency_ms, 1) if self.ewma_latency_ms is not None else None,
+            "ewma_error_rate": round(self.ewma_error_rate, 4),
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "client": self.client.stats(),
+        }
+
+
+class EndpointRouter:
+    """
+    Routes each completion to the best of several OpenAI-compatible endpoints.
+    Endpoints are ranked by EWMA latency weighted by error rate; when one fails
+    the next is tried while the deadline allows. With hedging enabled, a
+    second request goes to the runner-up once the primary passes its p95
+    latency, the first answer wins and the other request is cancelled.
+    """
+
+    def __init__(self, endpoints, hedge=None, hedge_min_samples=None):
+        if not endpoints:
+            raise ValueError("EndpointRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge = hedge if hedge is not None else env_bool("CONSULTANT_HEDGE", False)
+        self.hedge_min_samples = (
+            hedge_min_samples if hedge_min_samples is not None
+            else env_int("CONSULTANT_HEDGE_MIN_SAMPLES", 20)
+        )
+        self.failovers = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """
+        Build a router from a list of endpoint dicts with "api_url", "model",
+        an optional "name" and either "api_key" or "api_key_env".
+        """
+        endpoints = []
+        for i, entry in enumerate(config):
+            api_key = entry.get("api_key") or os.environ.get(entry.get("api_key_env", ""), "")
+            endpoints.append(Endpoint(
+                entry.get("name", f"endpoint-{i}"), entry["api_url"], api_key, entry["model"]
+            ))
+        return cls(endpoints, **kwargs)
+
+    def ranked(self):
+        """Available endpoints, best first (all of them if none are available)."""
+        available = [e for e in self.endpoints if e.available] or [e for e in self.endpoints if e.api_key]
+        return sorted(available, key=lambda e: e.score())
+
+    async def request(self, data, on_delta=None, deadline=None):
+        """Send a completion request to the best endpoint, failing over or hedging as configured."""
+        candidates = self.ranked()
+        if not candidates:
+            return {"error": "No upstream endpoint has an API key configured"}
+
+        # Once partial output reached the caller another endpoint can't take over
+        forwarded = {"any": False}
+        if on_delta is not None:
+            caller_on_delta = on_delta
+
+            async def on_delta(text):
+                forwarded["any"] = True
+                await caller_on_delta(text)
+
+        if self.hedge and len(candidates) > 1 and candidates[0].p95_ms(self.hedge_min_samples) is not None:
+            response_data, hedge_sent = await self._hedged(candidates[0], candidates[1], data, on_delta, deadline)
+            # The runner-up is still a failover target unless it already got the request
+            candidates = candidates[2:] if hedge_sent else candidates[1:]
+        else:
+            response_data = await candidates[0].request(data, on_delta, deadline)
+            candidates = candidates[1:]
+
+        for endpoint in candidates:
+            if "error" not in response_data or forwarded["any"]:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            self.failovers += 1
+            response_data = await endpoint.request(data, on_delta, deadline)
+        return response_data
+
+    async def _hedged(self, primary, secondary, data, on_delta, deadline):
+        """
+        Race primary against secondary, sending to secondary only once primary
+        passes its p95. Returns (response_data, whether secondary was sent to).
+        """
+        tasks = {}
+        race = {"winner": None}
+
+        def first_token_wins(endpoint):
+            # When streaming, the first endpoint to produce a token wins the race
+            if on_delta is None:
+                return None
+            async def forward(text):
+                if race["winner"] is None:
+                    race["winner"] = endpoint
+                    for other, task in tasks.items():
+                        if other is not endpoint:
+                            task.cancel()
+                if race["winner"] is endpoint:
+                    await on_delta(text)
+            return forward
+
+        tasks[primary] = asyncio.ensure_future(primary.request(data, first_token_wins(primary), deadline))
+        pending = {tasks[primary]}
+        response_data = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=primary.p95_ms(self.hedge_min_samples) / 1000)
+            if not done and race["winner"] is None:
+                self.hedged += 1
+                tasks[secondary] = asyncio.ensure_future(
+                    secondary.request(data, first_token_wins(secondary), deadline)
+                )
+            pending = set(tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    result = task.result()
+                    if "error" not in result:
+                        response_data = result
+                        break
+                    response_data = response_data or result
+                if response_data is not None and "error" not in response_data:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if response_data is None:
+            response_data = {"error": "Hedged requests were cancelled"}
+        if response_data.get("endpoint") == secondary.name and "error" not in response_data:
+            self.hedge_wins += 1
+        return response_data, secondary in tasks
+
+    def stats(self):
+        """Return routing counters and per-endpoint health."""
+        return {
+            "hedging": self.hedge,
+            "failovers": self.failovers,
+            "hedged_requests": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "endpoints": [e.stats() for e in self.endpoints],
+        }
+
+    async def aclose(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.aclose()
+
+
+# Process-wide router, only built when CONSULTANT_ENDPOINTS is configured
+_shared_router = None
+_shared_router_loaded = False
+
+
+def load_endpoint_config(value):
+    """Parse CONSULTANT_ENDPOINTS: inline JSON or a path to a JSON file."""
+    value = value.strip()
+    if not value.startswith("["):
+        with open(value, "r") as config_file:
+            value = config_file.read()
+    return json.loads(value)
+
+
+def get_shared_router():
+    """Return the shared router, or None when no endpoints are configured."""
+    global _shared_router, _shared_router_loaded
+    if not _shared_router_loaded:
+        _shared_router_loaded = True
+        config = env_str("CONSULTANT_ENDPOINTS")
+        if config:
+            _shared_router = EndpointRouter.from_config(load_endpoint_config(config))
+    return _shared_router
+
+
+async def aclose_shared_router():
+    if _shared_router is not None:
+        await _shared_router.aclose()
@@ -0,0 +1,117 @@
+from fallback_templates import (
+    ARCHITECTURE_TEMPLATE,
+    CODE_REVIEW_TEMPLATE,
+    DEBUGGING_TEMPLATE,
+    GENERAL_TEMPLATE,
+    OPTIMIZATION_TEMPLATE,
+    SECURITY_TEMPLATE,
+)
+
+# Keyword weights per category. Categories are listed in priority order,
+# which breaks ties between equal scores.
+CATEGORY_KEYWORDS = {
+    "code_review": {
+        "review": 2, "analyze": 2, "analyse": 2, "analyzing": 2, "analysis": 2, "assessment": 2,
+    },
+    "optimization": {
+        "optimize": 2, "optimise": 2, "optimizing": 2, "optimization": 2,
+        "performance": 2, "bottleneck": 2, "slow": 1,
+    },
+    "architecture": {
+        "architecture": 2, "design": 1, "structure": 1, "system": 1,
+    },
+    "debugging": {
+        "debug": 2, "debugging": 2, "bug": 2, "error": 1, "issue": 1, "problem": 1,
+    },
+    "security": {
+        "security": 2, "secure": 2, "vulnerability": 2, "vulnerabilities": 2,
+    },
+}
+
+CATEGORY_TEMPLATES = {
+    "code_review": CODE_REVIEW_TEMPLATE,
+    "optimization": OPTIMIZATION_TEMPLATE,
+    "architecture": ARCHITECTURE_TEMPLATE,
+    "debugging": DEBUGGING_TEMPLATE,
+    "security": SECURITY_TEMPLATE,
+    "general": GENERAL_TEMPLATE,
+}
+
+DEFAULT_CATEGORY = "general"
+
+# Inflections a keyword may carry and still count as a whole-word match
+SUFFIXES = ("", "s", "es", "d", "ed", "ing")
+
+# Byte translation table for the tokenizer. ASCII letters are lowercased;
+# digits, underscores and non-ASCII bytes stay word characters, and every
+# other byte becomes a separator, the same split as a regex \b.
+_WORD_BYTES = bytes(
+    b + 32 if 65 <= b <= 90
+    else b if 97 <= b <= 122 or 48 <= b <= 57 or b == 95 or b >= 128
+    else 32
+    for b in range(256)
+)
+
+
+class FallbackEngine:
+    """
+    Precompiled router for the offline consulting templates.
+    The query is lowercased and split into words by one bytes.translate pass
+    and looked up in a table of every keyword and its inflections, so only
+    whole words count ('designated' no longer matches 'design'). Each
+    category's weights are summed and the best score wins. Templates are
+    pre-split around their {query} placeholder so rendering is a
+    concatenation.
+    """
+
+    def __init__(self, category_keywords=CATEGORY_KEYWORDS, templates=CATEGORY_TEMPLATES,
+                 default_category=DEFAULT_CATEGORY):
+        self.default_category = default_category
+        self._priority = {category: i for i, category in enumerate(category_keywords)}
+        self._words = {}
+        for category, keywords in category_keywords.items():
+            for keyword, weight in keywords.items():
+                self._words[keyword.encode()] = (category, weight)
+        # Inflected forms never override a keyword listed in its own right
+        for category, keywords in category_keywords.items():
+            for keyword, weight in keywords.items():
+                for suffix in SUFFIXES:
+                    self._words.setdefault((keyword + suffix).encode(), (category, weight))
+        self._templates = {}
+        for category, template in templates.items():
+            before, after = template.split("{query}")
+            self._templates[category] = (before, after)
+
+    def scores(self, query):
+        """Return the summed weight of the distinct keywords found per category."""
+        words = query.encode("utf-8", "replace").translate(_WORD_BYTES).split()
+        scores = {}
+        for word in self._words.keys() & words:
+            category, weight = self._words[word]
+            scores[category] = scores.get(category, 0) + weight
+        return scores
+
+    def classify(self, query):
+        """Return the best matching category for a query."""
+        scores = self.scores(query)
+        if not scores:
+            return self.default_category
+        best, best_key = None, None
+        for category, score in scores.items():
+            key = (score, -self._priority[category])
+            if best_key is None or key > best_key:
+                best, best_key = category, key
+        return best
+
+    def render(self, category, query):
+        """Render a category's template for query."""
+        before, after = self._templates[category]
+        return before + query + after
+
+    def respond(self, query):
+        """Classify a query and render its consulting template."""
+        return self.render(self.classify(query), query)
+
+
+# Shared engine; it is immutable once built
+FALLBACK_ENGINE = FallbackEngine()
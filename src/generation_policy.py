@@ -0,0 +1,151 @@
+import json
+import math
+import re
+import threading
+from collections import deque
+
+from config import env_bool, env_int, env_str
+from fallback_engine import CATEGORY_KEYWORDS, DEFAULT_CATEGORY, FALLBACK_ENGINE
+from metrics import get_shared_metrics
+
+# Short prompts without any category keyword that ask what something means
+# ("what does idempotent mean here?"); any other such prompt is "general"
+CLARIFICATION = "clarification"
+
+CLARIFICATION_CUES = re.compile(
+    r"\bwhat (?:does|do|did) .+ mean\b|\bwhat do you mean\b|\bwhat is meant by\b|\bdefine\b"
+    r"|\bdefinition of\b|\bmeaning of\b|\bstand for\b|\bhere\s*\?\s*$"
+    # "is it"/"is that" only when asking about something already said, not "is it safe to ..."
+    r"|\b(?:is|isn't) (?:it|that|this) (?:the same|what you mean|what you meant|different from)\b",
+    re.IGNORECASE,
+)
+
+QUERY_CLASSES = tuple(CATEGORY_KEYWORDS) + (DEFAULT_CATEGORY, CLARIFICATION)
+
+# Generation settings per query class; "model": None keeps the agent's model
+DEFAULT_POLICIES = {
+    "architecture": {"max_tokens": 2048, "temperature": 0.3, "model": None},
+    "code_review": {"max_tokens": 1536, "temperature": 0.3, "model": None},
+    "security": {"max_tokens": 1536, "temperature": 0.2, "model": None},
+    "optimization": {"max_tokens": 1536, "temperature": 0.3, "model": None},
+    "debugging": {"max_tokens": 1024, "temperature": 0.2, "model": None},
+    "general": {"max_tokens": 1024, "temperature": 0.3, "model": None},
+    "clarification": {"max_tokens": 384, "temperature": 0.2, "model": None},
+}
+
+# What every request asked for before budgets were picked per class
+LEGACY_POLICY = {"max_tokens": 2048, "temperature": 0.3, "model": None}
+
+
+def load_policy_config(value):
+    """Parse CONSULTANT_GENERATION_POLICY: inline JSON or a path to a JSON file."""
+    value = value.strip()
+    if not value.startswith("{"):
+        with open(value, "r") as config_file:
+            value = config_file.read()
+    return json.loads(value)
+
+
+class GenerationPolicy:
+    """
+    Picks max_tokens, temperature and model for a consultation from the
+    class of its prompt, using the fallback engine's categories plus
+    "clarification" for short prompts that match none of them and ask
+    what something means (see CLARIFICATION_CUES). Realized
+    completion lengths are recorded per class so the table can be tuned:
+    stats() reports their p50/p95 and how often answers hit the limit.
+    """
+
+    def __init__(self, policies=None, enabled=None, clarification_max_words=None, window=500):
+        """Initialize the policy table; unset options are read from the environment."""
+        self.enabled = enabled if enabled is not None else env_bool("CONSULTANT_ADAPTIVE_BUDGET", True)
+        self.clarification_max_words = (
+            clarification_max_words if clarification_max_words is not None
+            else env_int("CONSULTANT_CLARIFICATION_MAX_WORDS", 12)
+        )
+        if policies is None:
+            config = env_str("CONSULTANT_GENERATION_POLICY")
+            policies = load_policy_config(config) if config else {}
+        self.policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+        for name, overrides in policies.items():
+            self.policies[name] = dict(self.policies.get(name, LEGACY_POLICY), **overrides)
+        self.metrics = get_shared_metrics()
+        self._lock = threading.Lock()
+        self._usage = {}
+        self.window = window
+
+    def classify(self, query):
+        """Return the query class for a prompt."""
+        category = FALLBACK_ENGINE.classify(query)
+        if (category == DEFAULT_CATEGORY and len(query.split()) <= self.clarification_max_words
+                and CLARIFICATION_CUES.search(query)):
+            return CLARIFICATION
+        return category
+
+    def select(self, query):
+        """Return (query_class, policy) for a prompt; the legacy settings when disabled."""
+        query_class = self.classify(query)
+        if not self.enabled:
+            return query_class, LEGACY_POLICY
+        return query_class, self.policies.get(query_class, LEGACY_POLICY)
+
+    def record(self, query_class, usage, finish_reason=None):
+        """Record the token usage the upstream reported for one answer."""
+        if not usage or usage.get("completion_tokens") is None:
+            return
+        completion_tokens = usage["completion_tokens"]
+        truncated = finish_reason == "length"
+        with self._lock:
+            entry = self._usage.get(query_class)
+            if entry is None:
+                entry = self._usage[query_class] = {
+                    "requests": 0, "truncated": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "recent": deque(maxlen=self.window),
+                }
+            entry["requests"] += 1
+            entry["truncated"] += truncated
+            entry["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            entry["completion_tokens"] += completion_tokens
+            entry["recent"].append(completion_tokens)
+        self.metrics.completion_tokens.observe(completion_tokens, query_class=query_class)
+        if truncated:
+            self.metrics.truncations.inc(query_class=query_class)
+
+    def stats(self):
+        """Return each class's policy with its realized usage and a suggested max_tokens."""
+        classes = {}
+        with self._lock:
+            for name in sorted(set(self.policies) | set(self._usage)):
+                policy = self.policies.get(name, LEGACY_POLICY)
+                entry = self._usage.get(name)
+                stats = dict(policy)
+                if entry:
+                    recent = sorted(entry["recent"])
+                    p95 = recent[min(len(recent) - 1, math.ceil(0.95 * len(recent)) - 1)]
+                    stats.update(
+                        requests=entry["requests"],
+                        truncated=entry["truncated"],
+                        avg_prompt_tokens=round(entry["prompt_tokens"] / entry["requests"], 1),
+                        avg_completion_tokens=round(entry["completion_tokens"] / entry["requests"], 1),
+                        p50_completion_tokens=recent[len(recent) // 2],
+                        p95_completion_tokens=p95,
+                        max_completion_tokens=recent[-1],
+                    )
+                    if len(recent) >= 20:
+                        # Headroom over the observed p95, in steps of 64; truncation argues for more
+                        headroom = 1.5 if entry["truncated"] / entry["requests"] > 0.05 else 1.2
+                        stats["suggested_max_tokens"] = int(math.ceil(p95 * headroom / 64) * 64)
+                classes[name] = stats
+        return {"enabled": self.enabled, "classes": classes}
+
+
+# Process-wide policy shared by every agent
+_shared_policy = None
+
+
+def get_shared_generation_policy():
+    """Return the shared generation policy."""
+    global _shared_policy
+    if _shared_policy is None:
+        _shared_policy = GenerationPolicy()
+    return _shared_policy
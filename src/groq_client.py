@@ -0,0 +1,408 @@
+import asyncio
+import time
+
+import httpx
+
+from circuit_breaker import CircuitBreaker
+from config import env_bool, env_float, env_int
+from history_manager import estimate_message_tokens
+from json_codec import BODY_ENCODER, loads
+from metrics import get_shared_metrics
+from rate_limiter import RateLimitScheduler, RateLimitTimeout, backoff_delay, parse_retry_after
+
+# HTTP/2 needs the optional 'h2' package (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+USER_AGENT = "MCP-Software-Engineer-Consultant/1.0"
+
+# Upstream statuses worth retrying: rate limited or transiently unavailable
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+# A caller's deadline timer can fire this much before the deadline itself
+DEADLINE_SLACK = 0.05
+
+
+class RequestTimer:
+    """
+    Per-request stage timings. Connect, time to first byte and body read
+    come from httpcore trace events; serialize and JSON decode are timed by
+    the client. Stages are observed into the metrics histograms and
+    returned in milliseconds.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.events = {}
+        self.timings = {}
+
+    async def trace(self, event, info):
+        self.events[event] = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.timings[f"{stage}_ms"] = self.timings.get(f"{stage}_ms", 0.0) + seconds * 1000
+
+    def finish(self):
+        """Derive the transport stages from the last attempt's trace events and observe every stage."""
+        events = self.events
+        connect = None
+        for step in ("connection.connect_tcp", "connection.start_tls"):
+            started, completed = events.get(f"{step}.started"), events.get(f"{step}.complete")
+            if started is not None and completed is not None:
+                connect = (connect or 0.0) + completed - started
+        if connect is not None:
+            self.add("connect", connect)
+        for protocol in ("http11", "http2"):
+            sent = events.get(f"{protocol}.send_request_headers.started")
+            headers = events.get(f"{protocol}.receive_response_headers.complete")
+            body = events.get(f"{protocol}.receive_response_body.complete")
+            if sent is not None and headers is not None:
+                self.add("ttfb", headers - sent)
+                if body is not None:
+                    self.add("body_read", body - headers)
+                break
+        for key, value in self.timings.items():
+            self.metrics.observe_stage(key[:-3], value / 1000)
+        return self.timings
+
+
+async def sse_lines(response):
+    """Yield the lines of a server-sent event stream as bytes, without decoding them to text."""
+    pending = b""
+    async for data in response.aiter_bytes():
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+class AsyncGroqClient:
+    """
+    Async transport for the Groq (OpenAI-compatible) chat completions API.
+    Keeps a pool of keep-alive connections so concurrent consultations share
+    TCP/TLS sessions instead of paying a fresh handshake on every request.
+    Requests go through a RateLimitScheduler and are retried with jittered
+    backoff (honouring Retry-After) while they are still within their deadline.
+    A CircuitBreaker refuses requests outright while the endpoint is failing.
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, max_connections=None,
+                 max_keepalive_connections=None, keepalive_expiry=None,
+                 connect_timeout=None, read_timeout=None, http2=None,
+                 request_deadline=None, max_retries=None, scheduler=None, breaker=None,
+                 metrics=None):
+        """Initialize the client; unset options are read from the environment."""
+        self.api_url = api_url
+        self.max_connections = max_connections or env_int("GROQ_MAX_CONNECTIONS", 20)
+        self.max_keepalive_connections = (
+            max_keepalive_connections or env_int("GROQ_MAX_KEEPALIVE_CONNECTIONS", 10)
+        )
+        self.keepalive_expiry = keepalive_expiry or env_float("GROQ_KEEPALIVE_EXPIRY", 30.0)
+        self.connect_timeout = connect_timeout or env_float("GROQ_CONNECT_TIMEOUT", 5.0)
+        self.read_timeout = read_timeout or env_float("GROQ_READ_TIMEOUT", 60.0)
+        if http2 is None:
+            http2 = env_bool("GROQ_HTTP2", True)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.request_deadline = request_deadline or env_float("GROQ_REQUEST_DEADLINE", 60.0)
+        self.max_retries = max_retries if max_retries is not None else env_int("GROQ_MAX_RETRIES", 4)
+        self.scheduler = scheduler or RateLimitScheduler()
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or get_shared_metrics()
+
+        self._client = None
+        self._loop = None
+        self._closing = set()
+        self.retries = 0
+        self.rate_limited = 0
+        self.circuit_rejections = 0
+        self.streams = 0
+        self.last_ttft_ms = None
+        self.total_ttft_ms = 0.0
+
+    def _get_client(self):
+        """Return the pooled httpx client, creating it for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Pooled connections are bound to the loop that opened them
+            if self._client is not None:
+                self._discard_client(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    self.read_timeout,
+                    connect=self.connect_timeout,
+                    pool=self.connect_timeout,
+                ),
+                headers={"User-Agent": USER_AGENT},
+            )
+            self._loop = loop
+        return self._client
+
+    def _discard_client(self, client, loop):
+        """Close a client left behind by another event loop, releasing its pooled connections."""
+        if loop.is_running() and loop is not asyncio.get_running_loop():
+            # Still serving another thread: close it there
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        task = asyncio.ensure_future(self._aclose_quietly(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose_quietly(client):
+        try:
+            await client.aclose()
+        except Exception:
+            # The old loop is closed; whatever the sockets still hold is released with them
+            pass
+
+    def _request_headers(self, api_key):
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+
+    async def _send(self, data, api_key, deadline, stream, timer):
+        """
+        Send a request through the scheduler, retrying rate limits, 5xx responses
+        and transport errors with backoff until the deadline. Returns
+        (response, None) on success or (None, error_dict). Streamed responses
+        must be closed by the caller. Stage timings are collected on timer.
+        """
+        circuit_open = {"error": "Circuit breaker open, upstream marked unavailable", "circuit_open": True}
+        if self.breaker.is_open():
+            self.circuit_rejections += 1
+            return None, circuit_open
+
+        serialize_started = time.perf_counter()
+        body = BODY_ENCODER.encode(data)
+        timer.add("serialize", time.perf_counter() - serialize_started)
+        cost_tokens = estimate_message_tokens(data.get("messages", []))
+        attempt = 0
+        while True:
+            try:
+                await self.scheduler.acquire(deadline, cost_tokens)
+            except RateLimitTimeout as e:
+                return None, {"error": str(e), "status": 429}
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, {"error": "Request deadline exceeded", "deadline_exceeded": True}
+            if not self.breaker.allow_request():
+                self.circuit_rejections += 1
+                return None, circuit_open
+            client = self._get_client()
+            request = client.build_request(
+                "POST",
+                self.api_url,
+                content=body,
+                headers=self._request_headers(api_key),
+                timeout=httpx.Timeout(
+                    min(self.read_timeout, remaining),
+                    connect=min(self.connect_timeout, remaining),
+                    pool=min(self.connect_timeout, remaining),
+                ),
+            )
+            # Only the last attempt's transport timings are kept
+            timer.events = {}
+            request.extensions["trace"] = timer.trace
+            retry_after = None
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                self.metrics.upstream_responses.inc(status="transport_error")
+                error = {"error": f"{type(e).__name__}: {e}"}
+            except asyncio.CancelledError:
+                if time.monotonic() >= deadline - DEADLINE_SLACK:
+                    # Cut off at its deadline with no answer: as much a timeout as one httpx raises
+                    self.breaker.record_failure()
+                    self.metrics.upstream_responses.inc(status="deadline")
+                else:
+                    # The caller gave up early (e.g. disconnected); don't strand a probe
+                    self.breaker.release_probe()
+                raise
+            else:
+                self.metrics.upstream_responses.inc(status=str(response.status_code))
+                self.scheduler.update_from_headers(response.headers)
+                # Any answer short of a timeout or server error means the endpoint is up
+                if response.status_code >= 500 or response.status_code == 408:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code < 400:
+                    return response, None
+                if stream:
+                    await response.aclose()
+                error = {"error": f"HTTP {response.status_code} from upstream", "status": response.status_code}
+                if response.status_code not in RETRYABLE_STATUSES:
+                    return None, error
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if response.status_code == 429:
+                    self.rate_limited += 1
+
+            delay = backoff_delay(attempt, retry_after=retry_after)
+            if error.get("status") == 429:
+                # Hold back every queued request, not just this one, for as long as
+                # the server asked; this request's own jittered backoff can be longer
+                self.scheduler.block_for(retry_after if retry_after is not None else delay)
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                return None, error
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def _deadline(self, deadline):
+        return deadline if deadline is not None else time.monotonic() + self.request_deadline
+
+    async def post_json(self, data, api_key, deadline=None):
+        """
+        POST a chat completion request and return the decoded JSON response.
+        deadline is a time.monotonic() timestamp; by default GROQ_REQUEST_DEADLINE
+        seconds from now. Failures are returned as {"error": ...}. Successful
+        responses carry a "timings" entry with the stage timings in ms.
+        """
+        timer = RequestTimer(self.metrics)
+        try:
+            response, error = await self._send(data, api_key, self._deadline(deadline), False, timer)
+            if error is not None:
+                return error
+            decode_started = time.perf_counter()
+            response_data = loads(response.content)
+            timer.add("json_decode", time.perf_counter() - decode_started)
+        except Exception as e:
+            return {"error": str(e)}
+        response_data["timings"] = timer.finish()
+        return response_data
+
+    async def stream_json(self, data, api_key, on_delta=None, deadline=None):
+        """
+        POST a streaming chat completion request and parse the SSE stream as it arrives.
+        Each content delta is awaited through on_delta(text). Returns a response shaped
+        like a non-streaming completion, plus a "timings" entry with the stage timings,
+        ttft_ms and total_ms. Retries only happen before the stream starts.
+        """
+        data = dict(data, stream=True)
+        timer = RequestTimer(self.metrics)
+        started = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        finish_reason = None
+        usage = None
+        try:
+            response, error = await self._send(data, api_key, self._deadline(deadline), True, timer)
+            if error is not None:
+                return error
+            decoding = 0.0
+            try:
+                async for line in sse_lines(response):
+                    if not line.startswith(b"data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b"[DONE]":
+                        # Read on to the end of the body so the connection goes back to the pool
+                        continue
+                    decode_started = time.perf_counter()
+                    chunk = loads(payload)
+                    decoding += time.perf_counter() - decode_started
+                    # Groq reports usage in x_groq on the final chunk, OpenAI in usage
+                    usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+                    if not chunk.get("choices"):
+                        continue
+                    choice = chunk["choices"][0]
+                    finish_reason = choice.get("finish_reason") or finish_reason
+                    text = (choice.get("delta") or {}).get("content")
+                    if not text:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started) * 1000
+                        self._record_ttft(ttft_ms)
+                    parts.append(text)
+                    if on_delta is not None:
+                        await on_delta(text)
+            finally:
+                await response.aclose()
+            timer.add("json_decode", decoding)
+        except Exception as e:
+            return {"error": str(e)}
+
+        return {
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(parts)},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+            "timings": dict(
+                timer.finish(),
+                ttft_ms=ttft_ms,
+                total_ms=(time.perf_counter() - started) * 1000,
+            ),
+        }
+
+    def _record_ttft(self, ttft_ms):
+        self.streams += 1
+        self.last_ttft_ms = ttft_ms
+        self.total_ttft_ms += ttft_ms
+
+    def stats(self):
+        """Return connection settings and time-to-first-token figures."""
+        return {
+            "api_url": self.api_url,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "scheduler": self.scheduler.stats(),
+            "circuit_breaker": self.breaker.stats(),
+            "circuit_rejections": self.circuit_rejections,
+            "streams": self.streams,
+            "last_ttft_ms": round(self.last_ttft_ms, 1) if self.last_ttft_ms is not None else None,
+            "avg_ttft_ms": round(self.total_ttft_ms / self.streams, 1) if self.streams else None,
+        }
+
+    async def aclose(self):
+        """Close pooled connections."""
+        if self._client is not None:
+            client, self._client, self._loop = self._client, None, None
+            await client.aclose()
+
+
+# Process-wide clients, one pool per endpoint
+_shared_clients = {}
+
+
+def get_shared_client(api_url=DEFAULT_API_URL):
+    """Return the shared pooled client for an endpoint."""
+    client = _shared_clients.get(api_url)
+    if client is None:
+        client = AsyncGroqClient(api_url)
+        _shared_clients[api_url] = client
+    return client
+
+
+def shared_clients():
+    """Return every shared client."""
+    return list(_shared_clients.values())
+
+
+def shared_client_stats():
+    """Return stats for every shared client."""
+    return [client.stats() for client in _shared_clients.values()]
+
+
+async def aclose_shared_clients():
+    """Close every shared client, e.g. on server shutdown."""
+    for client in list(_shared_clients.values()):
+        await client.aclose()
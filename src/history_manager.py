@@ -0,0 +1,160 @@
+import threading
+
+from config import env_int
+
+# Rough per-message framing cost of the chat template (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of earlier turns in this consultation (older messages were compacted): "
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English and code)."""
+    return (len(text) + 3) // 4
+
+
+def estimate_message_tokens(messages):
+    """Estimate the prompt tokens for a list of chat messages."""
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _is_summary(message):
+    return message["role"] == "system" and message["content"].startswith(SUMMARY_PREFIX)
+
+
+class HistoryManager:
+    """
+    Keeps conversation history within a prompt token budget.
+    The system prompt and the newest turns are always sent; older turns are
+    dropped and folded into a short locally built summary of the topics the
+    user raised, so long sessions don't grow the payload turn after turn.
+    """
+
+    def __init__(self, max_prompt_tokens=None, max_summary_tokens=None):
+        """Initialize the manager; unset options are read from the environment."""
+        self.max_prompt_tokens = (
+            max_prompt_tokens if max_prompt_tokens is not None
+            else env_int("CONSULTANT_HISTORY_TOKEN_BUDGET", 6000)
+        )
+        self.max_summary_tokens = (
+            max_summary_tokens if max_summary_tokens is not None
+            else env_int("CONSULTANT_HISTORY_SUMMARY_TOKENS", 300)
+        )
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.last_prompt_tokens = 0
+        self.total_prompt_tokens = 0
+        self.compactions = 0
+        self.turns_dropped = 0
+        self.tokens_dropped = 0
+        self.last_upstream_prompt_tokens = None
+
+    def _split(self, history):
+        """Split history into (system messages, summary text, turn pairs)."""
+        system, summary, turns = [], "", []
+        for message in history:
+            if _is_summary(message):
+                summary = message["content"][len(SUMMARY_PREFIX):]
+            elif message["role"] == "system" and not turns:
+                system.append(message)
+            elif message["role"] == "user" or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return system, summary, turns
+
+    def _turns_within(self, turns, budget):
+        """Count how many of the newest turns fit in budget tokens."""
+        kept = 0
+        for turn in reversed(turns):
+            cost = estimate_message_tokens(turn)
+            if cost > budget:
+                break
+            budget -= cost
+            kept += 1
+        return kept
+
+    def _summarize(self, summary, dropped_turns):
+        """Fold dropped turns into the running summary, keeping the newest topics."""
+        topics = [summary] if summary else []
+        for turn in dropped_turns:
+            question = " ".join(turn[0]["content"].split())
+            if len(question) > 160:
+                question = question[:157] + "..."
+            topics.append(f"asked: {question}")
+        text = "; ".join(topics)
+        max_chars = self.max_summary_tokens * 4
+        if len(text) > max_chars:
+            text = "..." + text[-(max_chars - 3):]
+        return text
+
+    def compact(self, history, reserve_tokens=0):
+        """
+        Return history trimmed to fit the budget, leaving reserve_tokens free
+        for the next message. Dropped turns are folded into the summary.
+        """
+        system, summary, turns = self._split(history)
+        budget = self.max_prompt_tokens - reserve_tokens - estimate_message_tokens(system)
+        kept = self._turns_within(turns, budget)
+        if summary or kept < len(turns):
+            # Leave room for the summary of whatever gets dropped
+            budget -= estimate_tokens(SUMMARY_PREFIX) + self.max_summary_tokens + MESSAGE_OVERHEAD_TOKENS
+            kept = self._turns_within(turns, budget)
+
+        dropped, recent = turns[:len(turns) - kept], turns[len(turns) - kept:]
+        if dropped:
+            summary = self._summarize(summary, dropped)
+            with self._lock:
+                self.compactions += 1
+                self.turns_dropped += len(dropped)
+                self.tokens_dropped += sum(estimate_message_tokens(turn) for turn in dropped)
+
+        compacted = list(system)
+        if summary:
+            compacted.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+        for turn in recent:
+            compacted.extend(turn)
+        return compacted
+
+    def build_messages(self, history, query):
+        """Build the message list for a new query within the token budget."""
+        user_message = {"role": "user", "content": query}
+        messages = self.compact(history, estimate_message_tokens([user_message])) + [user_message]
+        prompt_tokens = estimate_message_tokens(messages)
+        with self._lock:
+            self.requests += 1
+            self.last_prompt_tokens = prompt_tokens
+            self.total_prompt_tokens += prompt_tokens
+        return messages
+
+    def record_usage(self, usage):
+        """Record the prompt token count reported by the upstream API."""
+        if usage and usage.get("prompt_tokens") is not None:
+            with self._lock:
+                self.last_upstream_prompt_tokens = usage["prompt_tokens"]
+
+    def stats(self):
+        """Return per-request prompt token counts and compaction savings."""
+        with self._lock:
+            return {
+                "token_budget": self.max_prompt_tokens,
+                "requests": self.requests,
+                "last_prompt_tokens": self.last_prompt_tokens,
+                "avg_prompt_tokens": round(self.total_prompt_tokens / self.requests, 1) if self.requests else 0,
+                "compactions": self.compactions,
+                "turns_dropped": self.turns_dropped,
+                "tokens_dropped": self.tokens_dropped,
+                "last_upstream_prompt_tokens": self.last_upstream_prompt_tokens,
+            }
+
+
+# Process-wide manager shared by every agent
+_shared_manager = None
+
+
+def get_shared_history_manager():
+    """Return the shared history manager."""
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = HistoryManager()
+    return _shared_manager
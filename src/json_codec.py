@@ -0,0 +1,105 @@
+import json
+
+# orjson is optional (pip install orjson); the stdlib json module is the fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+# Built once: json.dumps() with non-default options constructs a new encoder per call
+_json_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def dumps(obj):
+    """Serialize obj to compact UTF-8 JSON bytes."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects lone surrogates; json escapes them like it did before
+            pass
+    return _json_encoder.encode(obj).encode("ascii")
+
+
+def loads(data):
+    """Parse JSON from bytes (or str) without decoding to text first."""
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+
+class RequestBodyEncoder:
+    """
+    Serializes chat completion requests, reusing the bytes of their parts
+    that don't change between calls: the parameters other than "messages"
+    and the leading system messages. Only the conversation turns are
+    serialized per request and spliced in after the cached fragments.
+    """
+
+    def __init__(self, max_fragments=256):
+        self.max_fragments = max_fragments
+        self._prefixes = {}
+        self._system_messages = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, cache, key, value):
+        if len(cache) >= self.max_fragments:
+            cache.clear()
+        cache[key] = value
+        return value
+
+    def _prefix(self, data):
+        params = tuple((key, value) for key, value in data.items() if key != "messages")
+        try:
+            prefix = self._prefixes.get(params)
+        except TypeError:
+            # Unhashable parameters (e.g. tool definitions) are serialized every time
+            return None
+        if prefix is None:
+            self.misses += 1
+            params_json = dumps(dict(params))
+            separator = b"," if params else b""
+            prefix = self._remember(self._prefixes, params, params_json[:-1] + separator + b'"messages":[')
+        else:
+            self.hits += 1
+        return prefix
+
+    def _system_message(self, message):
+        content = message.get("content")
+        if message.get("role") != "system" or len(message) != 2 or not isinstance(content, str):
+            return None
+        encoded = self._system_messages.get(content)
+        if encoded is None:
+            encoded = self._remember(self._system_messages, content, dumps(message))
+        return encoded
+
+    def encode(self, data):
+        """Return the JSON request body for data as bytes."""
+        messages = data.get("messages")
+        prefix = self._prefix(data) if isinstance(messages, list) else None
+        if prefix is None:
+            return dumps(data)
+        parts = []
+        for message in messages:
+            encoded = self._system_message(message)
+            if encoded is None:
+                break
+            parts.append(encoded)
+        if len(parts) < len(messages):
+            # The remaining turns in one call; strip the list's brackets to splice them in
+            parts.append(dumps(messages[len(parts):])[1:-1])
+        return prefix + b",".join(parts) + b"]}"
+
+    def stats(self):
+        return {
+            "orjson": ORJSON_AVAILABLE,
+            "prefix_hits": self.hits,
+            "prefix_misses": self.misses,
+            "cached_system_messages": len(self._system_messages),
+        }
+
+
+# Process-wide encoder shared by every client
+BODY_ENCODER = RequestBodyEncoder()
@@ -0,0 +1,261 @@
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+
+from config import env_float, env_int, env_str
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Chatty third-party loggers kept at WARNING unless CONSULTANT_LOG_LEVELS says otherwise
+QUIET_LOGGERS = ("httpx", "httpcore", "h2", "hpack", "mcp", "asyncio")
+
+# MCP logging/setLevel names mapped to Python levels
+MCP_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "notice": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL,
+    "alert": logging.CRITICAL,
+    "emergency": logging.CRITICAL,
+}
+
+_SECRET_PATTERNS = [
+    (re.compile(r"\b(gsk_|sk-|xai-)[A-Za-z0-9_\-]{8,}"), r"\1***"),
+    (re.compile(r"(Bearer\s+)\S+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"((?:api[_-]?key|authorization)[\"']?\s*[:=]\s*[\"']?(?:Bearer\s+)?)[^\s\"',}]+", re.IGNORECASE), r"\1***"),
+]
+
+
+def parse_levels(value):
+    """Parse 'httpx=INFO,mcpserver=DEBUG' into {logger_name: level}."""
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def redact_secrets(text, secrets=()):
+    """Mask API keys and bearer tokens in text."""
+    for secret in secrets:
+        if secret in text:
+            text = text.replace(secret, "***")
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactedPrompt:
+    """
+    Log argument standing in for a prompt. It is rendered lazily, on the
+    logging thread and only if the record is emitted, according to
+    CONSULTANT_LOG_PROMPTS: "redact" (length and a short hash, the
+    default), "truncate" (first 80 characters) or "full".
+    """
+
+    __slots__ = ("prompt",)
+    mode = "redact"
+
+    def __init__(self, prompt):
+        self.prompt = prompt
+
+    def __str__(self):
+        prompt = self.prompt if isinstance(self.prompt, str) else str(self.prompt)
+        if self.mode == "full":
+            return repr(prompt)
+        if self.mode == "truncate":
+            return repr(prompt[:80] + ("..." if len(prompt) > 80 else ""))
+        digest = hashlib.sha256(prompt.encode("utf-8", "replace")).hexdigest()[:12]
+        return f"<prompt len={len(prompt)} sha256={digest}>"
+
+
+def redact_prompt(prompt):
+    return RedactedPrompt(prompt)
+
+
+class RedactingFormatter(logging.Formatter):
+    """Formatter that masks API keys and bearer tokens in the final line."""
+
+    def __init__(self, fmt=LOG_FORMAT, secrets=()):
+        super().__init__(fmt)
+        self.secrets = [s for s in secrets if s and len(s) >= 8]
+
+    def format(self, record):
+        return redact_secrets(super().format(record), self.secrets)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass every WARNING and above, but only one in every 1/rate DEBUG and
+    INFO records per (logger, message template), starting with the first.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+        self._seen = {}
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if self.rate <= 0.0:
+            self.sampled_out += 1
+            return False
+        key = (record.name, record.msg)
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        if seen % max(1, round(1 / self.rate)) == 0:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller: records are queued as-is
+    (formatting and redaction happen on the listener thread) and dropped,
+    and counted, when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The listener runs in this process, so the record needn't be made picklable
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing when stop() finds the queue full
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Logging off the request hot path. Loggers hand records to a bounded
+    queue and a background listener thread formats, redacts and writes
+    them to stderr or CONSULTANT_LOG_FILE, so a slow pipe never stalls a
+    consultation (and nothing is written to stdout, which carries the MCP
+    stdio transport).
+    """
+
+    def __init__(self, stream=None, path=None, queue_size=None, sample_rate=None, level=None, levels=None):
+        """Initialize the pipeline; unset options are read from the environment."""
+        self.path = path if path is not None else env_str("CONSULTANT_LOG_FILE")
+        self.stream = stream
+        self.queue_size = queue_size if queue_size is not None else env_int("CONSULTANT_LOG_QUEUE_SIZE", 10000)
+        self.level = level if level is not None else (
+            logging.getLevelName(env_str("CONSULTANT_LOG_LEVEL", "INFO").upper())
+        )
+        if not isinstance(self.level, int):
+            self.level = logging.INFO
+        self.levels = levels if levels is not None else parse_levels(env_str("CONSULTANT_LOG_LEVELS"))
+        sample_rate = sample_rate if sample_rate is not None else env_float("CONSULTANT_LOG_SAMPLE_RATE", 1.0)
+        RedactedPrompt.mode = env_str("CONSULTANT_LOG_PROMPTS", "redact").lower()
+
+        self.queue = queue.Queue(self.queue_size)
+        self.handler = BackgroundQueueHandler(self.queue)
+        self.sampler = SamplingFilter(sample_rate)
+        self.handler.addFilter(self.sampler)
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def _target_handler(self):
+        if self.path:
+            target = logging.FileHandler(self.path, encoding="utf-8")
+        else:
+            target = logging.StreamHandler(self.stream or sys.stderr)
+        secrets = [os.environ.get(name, "") for name in os.environ if name.endswith("_API_KEY")]
+        target.setFormatter(RedactingFormatter(secrets=secrets))
+        return target
+
+    def start(self):
+        """Install the queue handler on the root logger and start the listener thread."""
+        with self._lock:
+            if self.listener is not None:
+                return
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel(self.level)
+            for name in QUIET_LOGGERS:
+                logging.getLogger(name).setLevel(logging.WARNING)
+            for name, level in self.levels.items():
+                logging.getLogger(name).setLevel(level)
+            self.listener = _Listener(self.queue, self._target_handler())
+            self.listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the listener thread."""
+        with self._lock:
+            if self.listener is None:
+                return
+            listener, self.listener = self.listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+    def set_level(self, level, logger_name=None):
+        """Change a logger's level at runtime (the root logger by default)."""
+        if isinstance(level, str):
+            level = MCP_LEVELS.get(level.lower(), logging.getLevelName(level.upper()))
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level {level!r}")
+        logging.getLogger(logger_name).setLevel(level)
+        if logger_name is None:
+            self.level = level
+        else:
+            self.levels[logger_name] = level
+
+    def set_sample_rate(self, rate):
+        self.sampler.rate = rate
+
+    def stats(self):
+        """Return levels, queue depth and how many records were dropped or sampled out."""
+        return {
+            "level": logging.getLevelName(logging.getLogger().level),
+            "levels": {name: logging.getLevelName(level) for name, level in self.levels.items()},
+            "sample_rate": self.sampler.rate,
+            "prompts": RedactedPrompt.mode,
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+        }
+
+
+# Process-wide pipeline, installed once by configure_logging()
+_pipeline = None
+
+
+def configure_logging(**kwargs):
+    """Install and start the shared logging pipeline (idempotent) and return it."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(**kwargs)
+        _pipeline.start()
+    return _pipeline
+
+
+def get_log_pipeline():
+    return _pipeline
@@ -1,23 +1,119 @@
 # hello.py
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 import os
-from dotenv import load_dotenv
-import logging
-import random
-import importlib
 import sys
+import json
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, suppress
+
+# The consultant agents, the Groq client and the cache/session stores are
+# imported on first use (see load_agents), so starting the server and calling
+# tools that don't consult stays off the network stack
+from agent_registry import AgentRegistry
+from config import env_bool, env_int, env_str, load_env_file
+from metrics import get_shared_metrics
+from singleflight import get_shared_single_flight
+from fallback_engine import FALLBACK_ENGINE
+from log_pipeline import configure_logging, redact_prompt
+from admission import PRIORITIES, get_shared_admission_controller, parse_client_priorities, parse_priority
 
-# Import the Qwen-powered software engineering consultant agent
-from agents import SoftwareEngineerAgent, TemplateSoftwareEngineerAgent
+# Load environment variables 
+load_env_file()
 
-logging.basicConfig(level=logging.DEBUG)
+# Log through a background queue to stderr (stdout carries the MCP stdio transport)
+log_pipeline = configure_logging()
 logger = logging.getLogger(__name__)
 
-# Load environment variables 
-load_dotenv()
+# Set by http_app(): the HTTP app closes pooled connections once at shutdown
+_app_closes_upstreams = False
+
+async def close_upstreams():
+    """Release pooled Groq connections, if any consultation opened them"""
+    if "groq_client" in sys.modules:
+        from groq_client import aclose_shared_clients
+        await aclose_shared_clients()
+    if "endpoint_router" in sys.modules:
+        from endpoint_router import aclose_shared_router
+        await aclose_shared_router()
+
+# Background cache warming (CONSULTANT_WARM_ON_STARTUP), while the server runs
+cache_warmer = None
+
+@asynccontextmanager
+async def background_warming():
+    """Warm the response cache in the background for the lifetime of the block"""
+    global cache_warmer
+    if not env_bool("CONSULTANT_WARM_ON_STARTUP"):
+        yield
+        return
+    from cache_warmer import start_cache_warming
+    cache_warmer, task = start_cache_warming(agent_registry.get(CONSULTANT_MODEL))
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+@asynccontextmanager
+async def consultant_lifespan(server):
+    """
+    Warm the cache while a stdio session runs and release pooled Groq
+    connections when it ends. Over HTTP this runs per MCP session (per
+    request when stateless), so the app lifespan does both instead.
+    """
+    if _app_closes_upstreams:
+        yield {}
+        return
+    try:
+        async with background_warming():
+            yield {}
+    finally:
+        await close_upstreams()
+
+CONSULTANT_MODEL = "qwen-2.5-coder-32b"
+BATCH_MAX_PROMPTS = env_int("CONSULTANT_BATCH_MAX_PROMPTS", 100)
+BATCH_MAX_CONCURRENCY = env_int("CONSULTANT_BATCH_MAX_CONCURRENCY", 16)
+# Part of a caller's deadline kept back for rendering the template fallback
+FALLBACK_RESERVE_MS = env_int("CONSULTANT_FALLBACK_RESERVE_MS", 50)
+# Default admission priority per MCP client name, e.g. "claude-code=high,nightly-batch=low"
+CLIENT_PRIORITIES = parse_client_priorities(env_str("CONSULTANT_CLIENT_PRIORITIES"))
+
+# Set by load_agents() on the first consultation
+template_agent = None
+
+def load_agents():
+    """
+    Import the Qwen-powered consultant agent on first use and return its class.
+    The import brings in the HTTP client, the response cache and the session
+    store, so it waits until a tool actually consults.
+    """
+    global template_agent
+    try:
+        from agents import SoftwareEngineerAgent, TemplateSoftwareEngineerAgent
+    except ImportError:
+        from agents_updated import SoftwareEngineerAgent, TemplateSoftwareEngineerAgent
+    if template_agent is None:
+        template_agent = TemplateSoftwareEngineerAgent()
+        # Validate the API key once rather than on every consultation
+        logger.info("Groq API key status: %s", template_agent.debug_api_key(os.environ.get('GROQ_API_KEY', '')))
+    return SoftwareEngineerAgent
+
+# Long-lived agents, reused across calls instead of being rebuilt per consultation
+agent_registry = AgentRegistry(factory_loader=load_agents)
+metrics = get_shared_metrics()
 
 # --- Create an MCP server ---
-mcp = FastMCP("SoftwareEngineeringConsultantServer")
+mcp = FastMCP("SoftwareEngineeringConsultantServer", lifespan=consultant_lifespan)
+
+@mcp._mcp_server.set_logging_level()
+async def set_logging_level(level):
+    """Apply an MCP logging/setLevel request to the server's own loggers"""
+    log_pipeline.set_level(level)
+    logger.info("Log level set to %s", level)
 
 # --- Add simple tools (optional, for context) ---
 @mcp.tool()
@@ -31,9 +127,124 @@ def get_greeting(name: str) -> str:
     """Get a personalized greeting"""
     return f"Hello, {name}!"
 
+def progress_forwarder(ctx, min_chars=64, min_interval=0.1):
+    """
+    Build an on_delta callback that forwards partial answers to the MCP client as
+    progress notifications. Deltas are batched so the client sees a notification
+    at most every min_interval seconds or min_chars characters, not per token.
+    Returns (on_delta, flush); call flush() once the stream has finished.
+    """
+    state = {"buffer": [], "size": 0, "sent": 0, "last_flush": time.monotonic()}
+
+    async def flush():
+        if not state["buffer"]:
+            return
+        chunk = "".join(state["buffer"])
+        state["buffer"].clear()
+        state["size"] = 0
+        state["sent"] += len(chunk)
+        state["last_flush"] = time.monotonic()
+        await ctx.report_progress(progress=state["sent"], message=chunk)
+
+    async def on_delta(text):
+        state["buffer"].append(text)
+        state["size"] += len(text)
+        if (state["size"] >= min_chars
+                or time.monotonic() - state["last_flush"] >= min_interval):
+            await flush()
+
+    return on_delta, flush
+
+def consultation_deadline(deadline_ms):
+    """
+    Turn a caller's latency budget in milliseconds into a time.monotonic()
+    deadline for the upstream call, keeping back time to render a fallback.
+    """
+    if not deadline_ms or deadline_ms <= 0:
+        return None
+    return time.monotonic() + max(0.0, deadline_ms - FALLBACK_RESERVE_MS) / 1000
+
+def request_priority(priority, ctx=None):
+    """
+    Resolve a call's admission priority: the tool argument if given, else the
+    calling client's default from CONSULTANT_CLIENT_PRIORITIES, else normal.
+    """
+    if priority is None and ctx is not None and CLIENT_PRIORITIES:
+        client_params = getattr(ctx.session, "client_params", None)
+        client_name = client_params.clientInfo.name if client_params is not None else None
+        priority = CLIENT_PRIORITIES.get(client_name)
+    return parse_priority(priority)
+
+async def consult(prompt, session_id=None, bypass_cache=False, on_delta=None, deadline=None,
+                  priority="normal"):
+    """
+    Run one consultation and return {"response", "source", "timings"}.
+    Never raises: any failure falls back to the enhanced consulting templates.
+    With a deadline (time.monotonic() timestamp) the upstream work is cut off
+    there and the template answer is served instead. Under overload the call
+    waits for an upstream slot by priority, or is shed (see admission.py).
+    """
+    logger.info("Processing consultation %s", redact_prompt(prompt))
+    started = time.perf_counter()
+    timings = {}
+    fallback_reason = None
+
+    try:
+        # Reuse the long-lived consultant agent for this model/session
+        agent = agent_registry.get(CONSULTANT_MODEL, session_id)
+        timings["agent_setup_ms"] = (time.perf_counter() - started) * 1000
+        metrics.observe_stage("agent_setup", timings["agent_setup_ms"] / 1000)
+        
+        if not agent.api_key and agent.router is None:
+            logger.warning("Groq API key is missing or invalid, using enhanced fallback consulting responses")
+        
+        # Generate strategic consulting response without blocking the event loop
+        consultation = agent.aconsult(prompt, bypass_cache=bypass_cache, on_delta=on_delta, deadline=deadline,
+                                      priority=priority)
+        if deadline is not None:
+            result = await asyncio.wait_for(consultation, timeout=max(0.0, deadline - time.monotonic()))
+        else:
+            result = await consultation
+        
+        # Make sure we have a valid consultation response
+        if result["response"] and isinstance(result["response"], str):
+            return record_consultation(result, started, timings)
+        logger.warning("API returned empty response, using enhanced consulting template")
+        fallback_reason = "empty_response"
+        
+    except asyncio.TimeoutError:
+        logger.info("Consultation deadline reached, using enhanced consulting template")
+        fallback_reason = "deadline"
+    except Exception as error:
+        # Fall back to enhanced consulting templates on error
+        logger.warning("Error during software engineering consultation, using fallback: %s", error)
+        fallback_reason = "exception"
+    
+    render_started = time.perf_counter()
+    # The agents failed to load if there is no template agent yet
+    response = template_agent.generate_response(prompt) if template_agent else FALLBACK_ENGINE.respond(prompt)
+    timings["fallback_render_ms"] = (time.perf_counter() - render_started) * 1000
+    metrics.observe_stage("fallback_render", timings["fallback_render_ms"] / 1000)
+    result = {"response": response, "source": "fallback", "fallback_reason": fallback_reason}
+    return record_consultation(result, started, timings)
+
+def record_consultation(result, started, timings):
+    """Attach the consultation's stage timings to result and count it in the metrics."""
+    result["timings"] = dict(timings, **result.get("timings", {}))
+    elapsed = time.perf_counter() - started
+    result["timings"]["total_ms"] = elapsed * 1000
+    metrics.consultation_seconds.observe(elapsed, source=result["source"])
+    metrics.consultations.inc(source=result["source"])
+    if result["source"] == "fallback":
+        metrics.fallbacks.inc(reason=result.get("fallback_reason") or "unknown")
+    return result
+
 # --- Define the Enhanced Software Engineering Consultant Tool ---
 @mcp.tool()
-def ask_software_engineer(prompt: str) -> str:
+async def ask_software_engineer(prompt: str, session_id: str | None = None,
+                                bypass_cache: bool = False, stream: bool = True,
+                                deadline_ms: int | None = None, priority: str | None = None,
+                                ctx: Context | None = None) -> str:
     """
     Consults Claude's Elite Software Engineering Advisor for expert technical guidance.
     This agent acts as Claude's senior technical consultant, specializing in strategic 
@@ -55,47 +266,73 @@ def ask_software_engineer(prompt: str) -> str:
     Args:
         prompt: The software engineering challenge, architecture question, or technical 
                strategy topic requiring expert consultation.
+        session_id: Optional conversation ID. Calls sharing a session_id continue the
+                    same multi-turn consultation; without one each call is independent.
+                    Sessions are kept on disk and survive restarts until they sit idle
+                    longer than CONSULTANT_SESSION_TTL (default 7 days).
+        bypass_cache: Skip the response cache and fetch a fresh answer (which then
+                      replaces the cached one).
+        stream: Stream the answer from the model and forward partial content as MCP
+                progress notifications while it is generated. Set to False for a
+                single non-streaming upstream request.
+        deadline_ms: Optional latency budget in milliseconds. If the model hasn't
+                     answered in time, the consulting template is returned instead.
+        priority: "high", "normal" or "low". When the server is overloaded, calls
+                  wait for the model in priority order; calls that would wait past
+                  their deadline get the consulting template (or a short "busy" answer).
     """
-    print(f"Software Engineering Consultant processing consultation: '{prompt}'")
+    priority = request_priority(priority, ctx)
+    deadline = consultation_deadline(deadline_ms)
+    on_delta, flush = progress_forwarder(ctx) if stream and ctx is not None else (None, None)
+    result = await consult(prompt, session_id=session_id, bypass_cache=bypass_cache,
+                           on_delta=on_delta, deadline=deadline, priority=priority)
+    if flush is not None:
+        await flush()
+    return result["response"]
 
-    try:
-        # Create the enhanced software engineering consultant agent
-        agent = SoftwareEngineerAgent(model="qwen-2.5-coder-32b")
-        agent.api_key = os.environ.get("GROQ_API_KEY", "")
-        
-        # Force reload to ensure we're using the latest changes
-        try:
-            importlib.reload(sys.modules['agents'])
-        except KeyError:
-            # Module not loaded yet, that's fine
-            pass
-        
-        # Validate API key and print debug info
-        template_agent = TemplateSoftwareEngineerAgent()
-        key_status = template_agent.debug_api_key(agent.api_key)
-        print(f"Groq API key status: {key_status}")
-        
-        if agent.api_key and len(agent.api_key) > 10:
-            print(f"Groq API key: {agent.api_key[:8]}...{agent.api_key[-5:]}")
-        else:
-            print("Warning: Groq API key is missing or invalid. Using enhanced fallback consulting responses.")
-        
-        # Generate strategic consulting response
-        result = agent.generate_response(prompt)
-        
-        # Make sure we have a valid consultation response
-        if result and isinstance(result, str) and len(result) > 0:
-            return result
-        else:
-            print("API returned empty response, using enhanced consulting template.")
-            return template_agent.generate_response(prompt)
-        
-    except Exception as error:
-        print(f"Error during software engineering consultation: {error}")
-        # Fall back to enhanced consulting templates on error
-        print("Using enhanced fallback consulting responses due to error.")
-        template_agent = TemplateSoftwareEngineerAgent()
-        return template_agent.generate_response(prompt)
+@mcp.tool()
+async def ask_software_engineer_batch(prompts: list[str], max_concurrency: int = 4,
+                                      bypass_cache: bool = False,
+                                      deadline_ms: int | None = None, priority: str | None = "low",
+                                      ctx: Context | None = None) -> list[dict]:
+    """
+    Consults the Software Engineering Advisor on several related questions at once.
+    Prompts are answered concurrently (up to max_concurrency at a time) and results
+    come back in the same order as the prompts. If an item can't be answered by the
+    model it falls back to the consulting template for that item only.
+    
+    Args:
+        prompts: The software engineering questions to consult on.
+        max_concurrency: How many prompts to consult on at the same time.
+        bypass_cache: Skip the response cache and fetch fresh answers.
+        deadline_ms: Optional latency budget in milliseconds for the whole batch; items
+                     not answered in time get the consulting template.
+        priority: Admission priority of the items ("high", "normal" or "low"); low by
+                  default so batches don't hold up interactive consultations.
+    
+    Returns a list with one entry per prompt containing "index", "status"
+    ("ok", "fallback" or "busy"), "source", "latency_ms" and "response".
+    """
+    if len(prompts) > BATCH_MAX_PROMPTS:
+        raise ValueError(f"At most {BATCH_MAX_PROMPTS} prompts can be sent in one batch")
+    
+    priority = request_priority(priority, ctx)
+    deadline = consultation_deadline(deadline_ms)
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, BATCH_MAX_CONCURRENCY)))
+    
+    async def run_item(index, prompt):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await consult(prompt, bypass_cache=bypass_cache, deadline=deadline, priority=priority)
+            return {
+                "index": index,
+                "status": result["source"] if result["source"] in ("fallback", "busy") else "ok",
+                "source": result["source"],
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                "response": result["response"],
+            }
+    
+    return await asyncio.gather(*(run_item(i, p) for i, p in enumerate(prompts)))
 
 # --- Add additional consulting resource ---
 @mcp.resource("consultation://{topic}")
@@ -110,6 +347,117 @@ def get_consultation_framework(topic: str) -> str:
     }
     return frameworks.get(topic.lower(), f"Comprehensive Software Engineering Consultation Framework for {topic}")
 
+# --- Runtime statistics for operators ---
+@mcp.resource("stats://consultant")
+def get_consultant_stats() -> str:
+    """Get agent registry, admission, upstream, cache, warming, similarity index, history, generation policy and logging statistics"""
+    from endpoint_router import get_shared_router
+    from generation_policy import get_shared_generation_policy
+    from groq_client import shared_client_stats
+    from history_manager import get_shared_history_manager
+    from json_codec import BODY_ENCODER
+    from response_cache import get_shared_cache
+    from session_store import get_shared_session_store
+    from similarity_index import get_shared_index
+    cache = get_shared_cache()
+    index = get_shared_index(cache)
+    return json.dumps({
+        "agents": agent_registry.stats(),
+        "admission": get_shared_admission_controller().stats(),
+        "upstream": shared_client_stats(),
+        "request_body": BODY_ENCODER.stats(),
+        "router": get_shared_router().stats() if get_shared_router() else None,
+        "coalescing": get_shared_single_flight().stats(),
+        "response_cache": cache.stats() if cache else None,
+        "similarity_index": index.stats() if index else None,
+        "history": get_shared_history_manager().stats(),
+        "sessions": get_shared_session_store().stats() if get_shared_session_store() else None,
+        "generation_policy": get_shared_generation_policy().stats(),
+        "warming": cache_warmer.stats() if cache_warmer else None,
+        "logging": log_pipeline.stats(),
+    }, indent=2)
+
+def upstream_clients():
+    """(label, client) for every upstream connection pool, shared or per router endpoint."""
+    if "groq_client" not in sys.modules:
+        # Nothing has consulted yet, so there are no pools (and no need to load the client)
+        return []
+    from endpoint_router import get_shared_router
+    from groq_client import shared_clients
+    clients = [(client.api_url, client) for client in shared_clients()]
+    router = get_shared_router()
+    if router is not None:
+        clients += [(endpoint.name, endpoint.client) for endpoint in router.endpoints]
+    return clients
+
+metrics.gauge("consultant_active_agents", "Consultant agents currently held by the registry",
+              lambda: agent_registry.stats()["active_agents"])
+metrics.gauge("consultant_coalesced_in_flight", "Distinct upstream calls currently shared by coalesced callers",
+              lambda: get_shared_single_flight().stats()["in_flight"])
+metrics.gauge("consultant_admission_queue_depth", "Consultations waiting for an upstream slot, by priority",
+              lambda: {(("priority", name),): get_shared_admission_controller().queue_depth(name) for name in PRIORITIES})
+metrics.gauge("consultant_admission_active", "Consultations holding an upstream slot",
+              lambda: get_shared_admission_controller().active)
+metrics.gauge("consultant_upstream_queue_depth", "Requests waiting for an upstream send slot",
+              lambda: {(("upstream", label),): client.scheduler.queue_depth for label, client in upstream_clients()})
+metrics.gauge("consultant_circuit_open", "1 while an upstream's circuit breaker refuses requests",
+              lambda: {(("upstream", label),): int(client.breaker.is_open()) for label, client in upstream_clients()})
+
+@mcp.resource("metrics://consultant", mime_type="text/plain")
+def get_consultant_metrics() -> str:
+    """Get stage timing histograms and consultation counters in Prometheus text format"""
+    return metrics.render()
+
+# --- Streamable HTTP deployment (see serve.py) ---
+STARTED_AT = time.time()
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request):
+    """Liveness and readiness for load balancers and process supervisors"""
+    from starlette.responses import JSONResponse
+    open_circuits = [label for label, client in upstream_clients() if client.breaker.is_open()]
+    return JSONResponse({
+        "status": "degraded" if open_circuits else "ok",
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - STARTED_AT, 1),
+        "active_agents": agent_registry.stats()["active_agents"],
+        "open_circuits": open_circuits,
+    })
+
+def http_app(stateless=True, json_response=False, allowed_hosts=()):
+    """
+    Return the streamable HTTP ASGI app. Stateless by default so that any
+    worker process can answer any request; multi-turn consultations carry
+    their session_id and live in the shared session store. Pooled upstream
+    connections are closed when the app shuts down, after in-flight
+    requests have finished.
+    """
+    global _app_closes_upstreams
+    _app_closes_upstreams = True
+    mcp.settings.stateless_http = stateless
+    mcp.settings.json_response = json_response
+    security = mcp.settings.transport_security
+    if allowed_hosts and security is not None and security.enable_dns_rebinding_protection:
+        security.allowed_hosts = list(security.allowed_hosts) + list(allowed_hosts)
+    app = mcp.streamable_http_app()
+    session_manager_lifespan = app.router.lifespan_context
+    # sse_starlette ends open SSE streams as soon as SIGTERM arrives, which would cut
+    # off in-flight consultations; uvicorn's graceful shutdown timeout bounds them instead
+    from sse_starlette.sse import AppStatus
+    AppStatus.disable_automatic_graceful_drain()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        try:
+            async with session_manager_lifespan(app), background_warming():
+                yield
+        finally:
+            AppStatus.should_exit = True
+            await close_upstreams()
+
+    app.router.lifespan_context = lifespan
+    return app
+
 # --- How to run the enhanced server ---
 if __name__ == "__main__":
     print("Starting Claude's Enhanced Software Engineering Consultant Server...")
@@ -126,4 +474,6 @@ if __name__ == "__main__":
     print("="*70)
     print("\nTo run this server, use the FastMCP entry point command:")
     print("fastmcp run hello:mcp --reload")
+    print("\nFor a multi-worker streamable HTTP deployment:")
+    print("python serve.py --transport http --workers 4 --port 8000")
     print("="*70 + "\n")
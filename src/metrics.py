@@ -0,0 +1,266 @@
+import logging
+import math
+import threading
+
+from config import env_bool, env_str
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond local work to slow upstream answers
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Completion lengths in tokens, around the per-class max_tokens budgets
+TOKEN_BUCKETS = (64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192)
+
+# Stages of a consultation timed into consultant_stage_seconds
+STAGES = ("agent_setup", "serialize", "connect", "ttfb", "body_read", "json_decode", "fallback_render")
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, registry):
+        self.name = name
+        self.help = help_text
+        self._registry = registry
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry._notify(self.kind, self.name, amount, labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative histogram (Prometheus semantics) with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, registry, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self._registry = registry
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+        self._registry._notify(self.kind, self.name, value, labels)
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            return series[2] if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative))
+                samples.append((f"{self.name}_bucket", labels + (("le", "+Inf"),), count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Gauge:
+    """Gauge read from a callback at render time: a number, or {((label, value), ...): number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback):
+        self.name = name
+        self.help = help_text
+        self._callback = callback
+
+    def samples(self):
+        try:
+            value = self._callback()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, tuple(sorted(labels)), v) for labels, v in value.items() if v is not None]
+        return [(self.name, (), value)]
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+    Hooks registered with add_hook(fn) see every observation as
+    fn(kind, name, value, labels), e.g. to mirror them into OpenTelemetry.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._hooks = []
+
+    def counter(self, name, help_text):
+        return self._register(name, lambda: Counter(name, help_text, self))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: Histogram(name, help_text, self, buckets))
+
+    def gauge(self, name, help_text, callback):
+        return self._register(name, lambda: Gauge(name, help_text, callback))
+
+    def _register(self, name, factory):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = factory()
+        return metric
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def _notify(self, kind, name, value, labels):
+        for hook in self._hooks:
+            try:
+                hook(kind, name, value, labels)
+            except Exception:
+                # A broken exporter must never fail a consultation
+                pass
+
+    def render(self):
+        """Return every metric in Prometheus text format."""
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class ConsultantMetrics(MetricsRegistry):
+    """The consultant's own instruments, declared up front so callers share them."""
+
+    def __init__(self):
+        super().__init__()
+        self.stage_seconds = self.histogram(
+            "consultant_stage_seconds", "Time spent in each stage of a consultation, in seconds"
+        )
+        self.consultation_seconds = self.histogram(
+            "consultant_consultation_seconds", "End-to-end consultation latency by answer source, in seconds"
+        )
+        self.consultations = self.counter(
+            "consultant_consultations_total", "Consultations answered, by source (upstream, cache, similar, fallback, busy)"
+        )
+        self.cache_lookups = self.counter(
+            "consultant_cache_lookups_total", "Response cache lookups by result (hit, similar, miss)"
+        )
+        self.fallbacks = self.counter(
+            "consultant_fallbacks_total", "Template fallbacks served, by reason"
+        )
+        self.upstream_responses = self.counter(
+            "consultant_upstream_responses_total", "Upstream HTTP attempts by status code (or transport_error, deadline)"
+        )
+        self.completion_tokens = self.histogram(
+            "consultant_completion_tokens", "Completion tokens reported by the upstream, by query class",
+            buckets=TOKEN_BUCKETS,
+        )
+        self.truncations = self.counter(
+            "consultant_truncated_answers_total", "Answers cut off at max_tokens, by query class"
+        )
+        self.queue_wait_seconds = self.histogram(
+            "consultant_admission_wait_seconds", "Time consultations waited for an upstream slot, by priority"
+        )
+        self.admissions_shed = self.counter(
+            "consultant_admission_shed_total", "Consultations shed by admission control, by reason"
+        )
+
+    def observe_stage(self, stage, seconds):
+        self.stage_seconds.observe(seconds, stage=stage)
+
+
+def opentelemetry_hook(meter_name="claude-better-responses-mcp"):
+    """
+    Return a registry hook that mirrors observations into OpenTelemetry
+    instruments, or None when opentelemetry-api isn't installed. Exporting
+    is up to the OpenTelemetry SDK configured in the process.
+    """
+    try:
+        from opentelemetry import metrics as otel_metrics
+    except ImportError:
+        return None
+    meter = otel_metrics.get_meter(meter_name)
+    instruments = {}
+
+    def hook(kind, name, value, labels):
+        instrument = instruments.get(name)
+        if instrument is None:
+            if kind == "counter":
+                instrument = meter.create_counter(name)
+            else:
+                instrument = meter.create_histogram(name, unit="s" if name.endswith("_seconds") else "1")
+            instruments[name] = instrument
+        if kind == "counter":
+            instrument.add(value, labels)
+        else:
+            instrument.record(value, labels)
+
+    return hook
+
+
+# Process-wide metrics shared by the client, agents and MCP server
+_shared_metrics = None
+
+
+def get_shared_metrics():
+    """Return the shared metrics, attaching the OpenTelemetry hook if CONSULTANT_OTEL_METRICS is set."""
+    global _shared_metrics
+    if _shared_metrics is None:
+        _shared_metrics = ConsultantMetrics()
+        if env_bool("CONSULTANT_OTEL_METRICS"):
+            hook = opentelemetry_hook(env_str("CONSULTANT_OTEL_METER", "claude-better-responses-mcp"))
+            if hook is None:
+                logger.warning("CONSULTANT_OTEL_METRICS is set but opentelemetry-api is not installed")
+            else:
+                _shared_metrics.add_hook(hook)
+    return _shared_metrics
@@ -0,0 +1,190 @@
+import asyncio
+import email.utils
+import random
+import re
+import time
+
+from config import env_float, env_int
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request can't be scheduled before its deadline."""
+
+
+def parse_duration(value):
+    """Parse a Groq reset header such as '2m59.56s' or '120ms' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (delay in seconds or an HTTP date) into seconds."""
+    if not value:
+        return None
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class RateLimitScheduler:
+    """
+    Client-side scheduler that keeps requests inside the upstream rate limits.
+    Pacing follows the server: Groq's x-ratelimit-* response headers, 429s
+    and Retry-After hold requests back until the limits reset. A local
+    token bucket of requests_per_minute (CONSULTANT_RATE_LIMIT_RPM) can be
+    added for accounts whose limits the server doesn't report; it is off (0)
+    by default. Callers queue in FIFO order instead of being dropped, and
+    only give up when the wait would run past their deadline.
+    """
+
+    def __init__(self, requests_per_minute=None, burst=None):
+        """Initialize the scheduler; unset options are read from the environment."""
+        self.requests_per_minute = (
+            requests_per_minute if requests_per_minute is not None
+            else env_float("CONSULTANT_RATE_LIMIT_RPM", 0.0)
+        )
+        self.burst = burst if burst is not None else env_int("CONSULTANT_RATE_LIMIT_BURST", 10)
+
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._remaining_tokens = None
+        self._tokens_reset_at = 0.0
+        self._lock = None
+        self._loop = None
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.scheduled = 0
+        self.throttled = 0
+        self.deadline_exceeded = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.remaining_requests = None
+
+    def _get_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self, now):
+        if self.requests_per_minute > 0:
+            rate = self.requests_per_minute / 60.0
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+
+    def _wait_time(self, now, cost_tokens):
+        """Seconds until a request costing cost_tokens may be sent."""
+        wait = max(0.0, self._blocked_until - now)
+        if self.requests_per_minute > 0 and self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) * 60.0 / self.requests_per_minute)
+        if (self._remaining_tokens is not None and cost_tokens > self._remaining_tokens
+                and self._tokens_reset_at > now):
+            wait = max(wait, self._tokens_reset_at - now)
+        return wait
+
+    async def acquire(self, deadline, cost_tokens=0):
+        """
+        Wait for a send slot. deadline is a time.monotonic() timestamp;
+        raises RateLimitTimeout if the slot would only come after it.
+        """
+        started = time.monotonic()
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            # The lock makes waiters take their turn in arrival order
+            async with self._get_lock():
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(now, cost_tokens)
+                    if wait <= 0:
+                        break
+                    if now + wait > deadline:
+                        self.deadline_exceeded += 1
+                        raise RateLimitTimeout(
+                            f"Rate limited for another {wait:.1f}s, past the request deadline"
+                        )
+                    self.throttled += 1
+                    await asyncio.sleep(wait)
+                if self.requests_per_minute > 0:
+                    self._tokens -= 1
+                if self._remaining_tokens is not None:
+                    self._remaining_tokens -= cost_tokens
+                self.scheduled += 1
+        finally:
+            self.queue_depth -= 1
+            waited = time.monotonic() - started
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def update_from_headers(self, headers):
+        """Sync with the x-ratelimit-* headers of an upstream response."""
+        now = time.monotonic()
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is not None and remaining.isdigit():
+            self.remaining_requests = int(remaining)
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if self.remaining_requests == 0 and reset:
+                self._blocked_until = max(self._blocked_until, now + reset)
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None and remaining_tokens.isdigit():
+            self._remaining_tokens = int(remaining_tokens)
+            reset = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+            self._tokens_reset_at = now + reset if reset else 0.0
+
+    def headroom(self):
+        """Requests that could be sent right now without waiting (inf when not paced)."""
+        now = time.monotonic()
+        if self.queue_depth or self._blocked_until > now:
+            return 0
+        if self.requests_per_minute <= 0:
+            return float("inf")
+        self._refill(now)
+        return int(self._tokens)
+
+    def block_for(self, seconds):
+        """Hold every queued request back for seconds (e.g. after a 429)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def stats(self):
+        """Return queue depth, wait times and current limit figures."""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "scheduled": self.scheduled,
+            "throttled": self.throttled,
+            "deadline_exceeded": self.deadline_exceeded,
+            "avg_wait_ms": round(self.total_wait / self.scheduled * 1000, 1) if self.scheduled else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self._remaining_tokens,
+            "blocked_for_s": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+        }
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import env_bool, env_float, env_int, env_str
+from sqlite_wal import connect_wal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "claude-better-responses-mcp", "responses.sqlite3"
+)
+
+
+def normalize_prompt(prompt):
+    """Normalize a prompt for cache keying (case and whitespace insensitive)."""
+    return " ".join(prompt.lower().split())
+
+
+def hash_text(text):
+    """Stable hex digest used for system prompt fingerprints."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for consultation responses.
+    An in-memory LRU sits in front of a SQLite (WAL) store that survives
+    restarts. Entries expire after ttl seconds, and both tiers are bounded
+    by entry count with least-recently-used eviction.
+    """
+
+    def __init__(self, path=None, ttl=None, max_memory_entries=None, max_disk_entries=None):
+        """Initialize the cache; unset options are read from the environment."""
+        self.path = path or env_str("CONSULTANT_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else env_float("CONSULTANT_CACHE_TTL", 7 * 24 * 3600.0)
+        self.max_memory_entries = (
+            max_memory_entries if max_memory_entries is not None
+            else env_int("CONSULTANT_CACHE_MEMORY_ENTRIES", 512)
+        )
+        self.max_disk_entries = (
+            max_disk_entries if max_disk_entries is not None
+            else env_int("CONSULTANT_CACHE_DISK_ENTRIES", 50000)
+        )
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = connect_wal(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, prompt TEXT NOT NULL, response TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_access REAL NOT NULL,"
+            " namespace TEXT NOT NULL DEFAULT '')"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(responses)")]
+        if "namespace" not in columns:
+            self._db.execute("ALTER TABLE responses ADD COLUMN namespace TEXT NOT NULL DEFAULT ''")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+
+    @staticmethod
+    def make_namespace(model, temperature, max_tokens, system_prompt_hash):
+        """Fingerprint the generation parameters that answers are only valid for."""
+        material = json.dumps([model, temperature, max_tokens, system_prompt_hash])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def make_key(prompt, namespace):
+        """Build the cache key for a prompt within a parameter namespace."""
+        material = json.dumps([namespace, normalize_prompt(prompt)])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._remember_locked(key, row[0], row[1])
+            self.hits += 1
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, key, prompt, response, namespace=""):
+        """Store a response in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, prompt, response, created_at, last_access, namespace)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, prompt, response, now, now, namespace),
+            )
+            self._remember_locked(key, response, now)
+            self._puts_since_trim += 1
+            if self._puts_since_trim >= 100:
+                self._trim_disk_locked(now)
+
+    def _remember_locked(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk_locked(self, now):
+        """Delete expired rows and the least recently used rows over the size bound."""
+        self._puts_since_trim = 0
+        deleted = self._db.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            deleted += self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_disk_entries,),
+            ).rowcount
+        self.evictions += deleted
+
+    def contains(self, key):
+        """Whether an unexpired response is stored for key, without counting a lookup."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                return True
+            return self._db.execute(
+                "SELECT 1 FROM responses WHERE key = ? AND created_at >= ?", (key, time.time() - self.ttl)
+            ).fetchone() is not None
+
+    def iter_prompts(self, include_expired=False, limit=None):
+        """
+        Return (key, namespace, prompt) for stored responses, most recently
+        used first; expired ones (not yet trimmed) too with include_expired.
+        """
+        cutoff = float("-inf") if include_expired else time.time() - self.ttl
+        with self._lock:
+            return self._db.execute(
+                "SELECT key, namespace, prompt FROM responses WHERE created_at >= ?"
+                " ORDER BY last_access DESC LIMIT ?",
+                (cutoff, -1 if limit is None else limit),
+            ).fetchall()
+
+    def trim(self):
+        """Apply TTL and size bounds to the on-disk store now."""
+        with self._lock:
+            self._trim_disk_locked(time.time())
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0],
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Seconds before opening the cache is tried again after it failed
+OPEN_RETRY_INTERVAL = 30.0
+
+# Process-wide cache shared by every agent
+_shared_cache = None
+_shared_cache_retry_at = 0.0
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    Return the shared response cache, or None when disabled via
+    CONSULTANT_CACHE_ENABLED or while it can't be opened (retried every
+    OPEN_RETRY_INTERVAL seconds).
+    """
+    global _shared_cache, _shared_cache_retry_at
+    if not env_bool("CONSULTANT_CACHE_ENABLED", True):
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            if time.monotonic() < _shared_cache_retry_at:
+                return None
+            try:
+                _shared_cache = ResponseCache()
+            except (sqlite3.Error, OSError) as e:
+                _shared_cache_retry_at = time.monotonic() + OPEN_RETRY_INTERVAL
+                logger.warning("Response cache unavailable, continuing without it: %s", e)
+                return None
+        return _shared_cache
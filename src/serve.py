@@ -0,0 +1,81 @@
+"""
+Entry point for running the consultant as a server.
+
+    python serve.py                                      # stdio, for MCP hosts that spawn it
+    python serve.py --transport http --workers 4 --port 8000
+
+Over HTTP the FastMCP app is served as stateless streamable HTTP by N
+uvicorn worker processes, so a box's cores are all used and any worker can
+take any request. The workers share the SQLite response cache and session
+store, so a session_id started on one worker continues on another.
+SIGTERM/SIGINT shut down gracefully: workers stop accepting connections,
+let in-flight consultations finish (up to --shutdown-timeout seconds) and
+then close their upstream connections. GET /health reports each worker's
+status.
+"""
+import argparse
+import os
+
+from config import env_bool, env_float, env_int, env_str
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_app():
+    """ASGI app factory run in every worker; settings arrive through the environment."""
+    import mcpserver
+
+    allowed_hosts = [h.strip() for h in env_str("CONSULTANT_HTTP_ALLOWED_HOSTS").split(",") if h.strip()]
+    return mcpserver.http_app(
+        stateless=env_bool("CONSULTANT_HTTP_STATELESS", True),
+        json_response=env_bool("CONSULTANT_HTTP_JSON_RESPONSE", False),
+        allowed_hosts=allowed_hosts,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the software engineering consultant MCP server")
+    parser.add_argument("--transport", choices=("stdio", "http"), default=env_str("CONSULTANT_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=env_str("CONSULTANT_HTTP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=env_int("CONSULTANT_HTTP_PORT", 8000))
+    parser.add_argument("--workers", type=int, default=env_int("CONSULTANT_HTTP_WORKERS", os.cpu_count() or 1),
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--shutdown-timeout", type=float, default=env_float("CONSULTANT_SHUTDOWN_TIMEOUT", 30.0),
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--json-response", action="store_true", default=env_bool("CONSULTANT_HTTP_JSON_RESPONSE"),
+                        help="answer with plain JSON instead of SSE streams (no progress notifications)")
+    parser.add_argument("--allowed-host", action="append", default=[],
+                        help="extra Host header value to accept, e.g. consultant.internal:8000 (repeatable)")
+    parser.add_argument("--access-log", action="store_true", help="log every HTTP request")
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        import mcpserver
+        mcpserver.mcp.run()
+        return
+
+    import uvicorn
+
+    from log_pipeline import configure_logging
+
+    configure_logging()
+    # Spawned workers read their settings from the environment in create_app()
+    os.environ["CONSULTANT_HTTP_JSON_RESPONSE"] = "1" if args.json_response else "0"
+    if args.allowed_host:
+        os.environ["CONSULTANT_HTTP_ALLOWED_HOSTS"] = ",".join(args.allowed_host)
+    uvicorn.run(
+        "serve:create_app",
+        factory=True,
+        app_dir=SRC_DIR,
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers),
+        timeout_graceful_shutdown=args.shutdown_timeout,
+        # Leave logging to the queue-backed pipeline rather than uvicorn's own handlers
+        log_config=None,
+        access_log=args.access_log,
+    )
+
+
+if __name__ == "__main__":
+    main()
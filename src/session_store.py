@@ -0,0 +1,216 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config import env_bool, env_float, env_str
+from json_codec import dumps, loads
+from sqlite_wal import connect_wal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "claude-better-responses-mcp", "sessions.sqlite3"
+)
+
+
+class SessionStore:
+    """
+    Conversation histories of multi-turn consultations, kept in a SQLite
+    (WAL) file that every worker process opens, so whichever worker takes
+    a call can continue the session.
+
+    The store is append-only: each message is a row in session_turns, and
+    session_index holds one row per session with the sequence number its
+    live history starts at and the last one written (its version). A turn
+    appends two rows; when the history is compacted the new history is
+    appended as a checkpoint and the start moves past the old rows, which
+    cleanup() deletes along with sessions idle longer than the TTL. Agents
+    reload a history only when another process has moved its version on.
+    The system prompt isn't stored, only the turns (and summaries) after it.
+    """
+
+    def __init__(self, path=None, ttl=None, cleanup_interval=None):
+        """Initialize the store; unset options are read from the environment."""
+        self.path = path or env_str("CONSULTANT_SESSION_PATH", DEFAULT_SESSION_PATH)
+        self.ttl = ttl if ttl is not None else env_float("CONSULTANT_SESSION_TTL", 7 * 86400.0)
+        self.cleanup_interval = (
+            cleanup_interval if cleanup_interval is not None
+            else env_float("CONSULTANT_SESSION_CLEANUP_INTERVAL", 300.0)
+        )
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self.loads = 0
+        self.reloads = 0
+        self.appends = 0
+        self.checkpoints = 0
+        self.expired = 0
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = connect_wal(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_index ("
+            " session_id TEXT NOT NULL, model TEXT NOT NULL,"
+            " start_seq INTEGER NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, model))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS session_index_updated ON session_index (updated_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_turns ("
+            " session_id TEXT NOT NULL, model TEXT NOT NULL, seq INTEGER NOT NULL, message BLOB NOT NULL,"
+            " PRIMARY KEY (session_id, model, seq)) WITHOUT ROWID"
+        )
+
+    def load(self, session_id, model, known_version=0):
+        """
+        Return (messages, version) for a session, or (None, version) when the
+        stored version is still known_version and the caller's copy is current.
+        Sessions past their TTL are reported as empty.
+        """
+        with self._lock:
+            self.loads += 1
+            row = self._db.execute(
+                "SELECT start_seq, version, updated_at FROM session_index WHERE session_id = ? AND model = ?",
+                (session_id, model),
+            ).fetchone()
+            if row is None or time.time() - row[2] > self.ttl:
+                return None, 0
+            start_seq, version, _ = row
+            if version == known_version:
+                return None, version
+            self.reloads += 1
+            messages = self._db.execute(
+                "SELECT message FROM session_turns WHERE session_id = ? AND model = ? AND seq >= ? AND seq <= ?"
+                " ORDER BY seq",
+                (session_id, model, start_seq, version),
+            ).fetchall()
+        return [loads(message) for (message,) in messages], version
+
+    def append(self, session_id, model, messages):
+        """Append messages to a session's history and return its new version."""
+        with self._lock:
+            self.appends += 1
+            return self._write(session_id, model, messages, checkpoint=False)
+
+    def replace(self, session_id, model, messages):
+        """
+        Make messages the session's whole history (after compaction) and
+        return its new version. They are appended as a checkpoint; the rows
+        before it are left for cleanup().
+        """
+        with self._lock:
+            self.checkpoints += 1
+            return self._write(session_id, model, messages, checkpoint=True)
+
+    def _write(self, session_id, model, messages, checkpoint):
+        now = time.time()
+        rows = [dumps(message) for message in messages]
+        # IMMEDIATE takes the write lock up front so two workers can't claim the same seq
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT start_seq, version, updated_at FROM session_index WHERE session_id = ? AND model = ?",
+                (session_id, model),
+            ).fetchone()
+            version = row[1] if row else 0
+            start_seq = row[0] if row else 1
+            if checkpoint or row is None or now - row[2] > self.ttl:
+                start_seq = version + 1
+            self._db.executemany(
+                "INSERT INTO session_turns (session_id, model, seq, message) VALUES (?, ?, ?, ?)",
+                [(session_id, model, version + i, message) for i, message in enumerate(rows, 1)],
+            )
+            version += len(rows)
+            self._db.execute(
+                "INSERT INTO session_index (session_id, model, start_seq, version, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (session_id, model) DO UPDATE SET"
+                " start_seq = excluded.start_seq, version = excluded.version, updated_at = excluded.updated_at",
+                (session_id, model, start_seq, version, now),
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if now - self._last_cleanup >= self.cleanup_interval:
+            self._cleanup_locked(now)
+        return version
+
+    def cleanup(self):
+        """Delete expired sessions and turns superseded by a checkpoint. Returns the rows removed."""
+        with self._lock:
+            return self._cleanup_locked(time.time())
+
+    def _cleanup_locked(self, now):
+        self._last_cleanup = now
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            cutoff = now - self.ttl
+            expired = self._db.execute(
+                "DELETE FROM session_turns WHERE (session_id, model) IN"
+                " (SELECT session_id, model FROM session_index WHERE updated_at < ?)",
+                (cutoff,),
+            ).rowcount
+            sessions = self._db.execute("DELETE FROM session_index WHERE updated_at < ?", (cutoff,)).rowcount
+            superseded = self._db.execute(
+                "DELETE FROM session_turns WHERE seq < (SELECT start_seq FROM session_index AS i"
+                " WHERE i.session_id = session_turns.session_id AND i.model = session_turns.model)"
+            ).rowcount
+            self._db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            logger.warning("Session cleanup failed: %s", e)
+            return 0
+        self.expired += sessions
+        return expired + superseded
+
+    def stats(self):
+        """Return load/write counters and the number of stored sessions and turns."""
+        with self._lock:
+            return {
+                "sessions": self._db.execute("SELECT COUNT(*) FROM session_index").fetchone()[0],
+                "turns": self._db.execute("SELECT COUNT(*) FROM session_turns").fetchone()[0],
+                "ttl_s": self.ttl,
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "appends": self.appends,
+                "checkpoints": self.checkpoints,
+                "expired": self.expired,
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Seconds before opening the store is tried again after it failed
+OPEN_RETRY_INTERVAL = 30.0
+
+# Process-wide store shared by every session agent
+_shared_store = None
+_shared_store_retry_at = 0.0
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_session_store():
+    """
+    Return the shared session store, or None when disabled via
+    CONSULTANT_SESSION_STORE_ENABLED or while it can't be opened (retried
+    every OPEN_RETRY_INTERVAL seconds).
+    """
+    global _shared_store, _shared_store_retry_at
+    if not env_bool("CONSULTANT_SESSION_STORE_ENABLED", True):
+        return None
+    with _shared_store_lock:
+        if _shared_store is None:
+            if time.monotonic() < _shared_store_retry_at:
+                return None
+            try:
+                _shared_store = SessionStore()
+            except (sqlite3.Error, OSError) as e:
+                _shared_store_retry_at = time.monotonic() + OPEN_RETRY_INTERVAL
+                logger.warning("Session store unavailable, keeping sessions in memory: %s", e)
+                return None
+        return _shared_store
@@ -0,0 +1,218 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import env_bool, env_float, env_int
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from how i if in into is it its
+me my of on or our should so that the their them then there these this to us was we what
+when where which who why will with would you your please help need want any some just
+""".split())
+
+_SUFFIXES = ("ations", "ation", "ing", "ies", "es", "ed", "e", "s")
+
+# Mersenne prime for the universal hash family a*x + b mod p
+_PRIME = (1 << 61) - 1
+
+
+def _stem(word):
+    """Strip a common English suffix so 'optimizing' and 'optimize' share a shingle."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+# Words that give a comparison or migration its direction
+DIRECTIONAL = frozenset(("to", "from", "into", "than", "instead", "vs", "versus", "over"))
+
+
+def shingles(prompt):
+    """Reduce a prompt to its set of stemmed content words."""
+    return frozenset(
+        _stem(word) for word in _WORD_RE.findall(prompt.lower()) if word not in STOPWORDS
+    )
+
+
+def directions(prompt):
+    """
+    Map each directional word in a prompt to the stemmed content words it
+    points at: "from MySQL to PostgreSQL" gives {"from": {"mysql"}, "to":
+    {"postgresql"}}.
+    """
+    words = _WORD_RE.findall(prompt.lower())
+    targets = {}
+    for i, word in enumerate(words):
+        if word not in DIRECTIONAL:
+            continue
+        for following in words[i + 1:]:
+            if following not in STOPWORDS and following not in DIRECTIONAL:
+                targets.setdefault(word, set()).add(_stem(following))
+                break
+    return {word: frozenset(points_at) for word, points_at in targets.items()}
+
+
+def _reversed(directions_a, directions_b):
+    """Whether a directional word both prompts use points at different words in each."""
+    return any(directions_b[word] != points_at for word, points_at in directions_a.items() if word in directions_b)
+
+
+def _shingle_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over previously answered prompts.
+    Lets reworded prompts ("optimize my slow SQL query" vs "my SQL query is
+    slow, how to optimize") reuse a cached answer. Candidates come from LSH
+    buckets and are scored by exact Jaccard similarity of their shingle sets;
+    a match is served only at or above the configured threshold. Word sets
+    ignore order, so a candidate whose directional words point the other way
+    ("from MySQL to PostgreSQL" vs "from PostgreSQL to MySQL", "Redis faster
+    than Memcached" and the reverse) is never served.
+    Pure Python, offline, no extra dependencies.
+    """
+
+    def __init__(self, threshold=None, num_perm=64, bands=16, max_entries=None, min_shingles=None):
+        """Initialize the index; unset options are read from the environment."""
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold if threshold is not None else env_float("CONSULTANT_SIMILARITY_THRESHOLD", 0.8)
+        self.max_entries = max_entries if max_entries is not None else env_int("CONSULTANT_SIMILARITY_ENTRIES", 50000)
+        self.min_shingles = min_shingles if min_shingles is not None else env_int("CONSULTANT_SIMILARITY_MIN_TOKENS", 3)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        # Deterministic permutations so signatures are stable across restarts
+        seed = hashlib.sha256(b"consultant-minhash").digest()
+        self._perms = []
+        for i in range(num_perm):
+            digest = hashlib.sha256(seed + i.to_bytes(4, "little")).digest()
+            a = int.from_bytes(digest[:8], "little") % (_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:16], "little") % _PRIME
+            self._perms.append((a, b))
+
+        self._entries = OrderedDict()  # cache_key -> (namespace, shingles, directions, band keys)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.last_similarity = 0.0
+        self.total_lookup_ms = 0.0
+        self.max_lookup_ms = 0.0
+
+    def _signature(self, shingle_set):
+        hashes = [_shingle_hash(s) for s in shingle_set]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, namespace, shingle_set):
+        signature = self._signature(shingle_set)
+        return [
+            (namespace, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def add(self, prompt, namespace, cache_key):
+        """Index a prompt whose answer is stored under cache_key."""
+        shingle_set = shingles(prompt)
+        if len(shingle_set) < self.min_shingles:
+            return
+        band_keys = self._band_keys(namespace, shingle_set)
+        with self._lock:
+            if cache_key in self._entries:
+                self._remove_locked(cache_key)
+            self._entries[cache_key] = (namespace, shingle_set, directions(prompt), band_keys)
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._remove_locked(next(iter(self._entries)))
+
+    def remove(self, cache_key):
+        """Forget an indexed prompt, e.g. after its cache entry expired."""
+        with self._lock:
+            if cache_key in self._entries:
+                self._remove_locked(cache_key)
+
+    def _remove_locked(self, cache_key):
+        _, _, _, band_keys = self._entries.pop(cache_key)
+        for band_key in band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(cache_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def lookup(self, prompt, namespace):
+        """
+        Find the most similar indexed prompt in the same namespace.
+        Returns {"cache_key", "similarity", "latency_ms"} when the best
+        candidate clears the threshold, otherwise None.
+        """
+        started = time.perf_counter()
+        shingle_set = shingles(prompt)
+        prompt_directions = directions(prompt)
+        best_key, best_score = None, 0.0
+        if len(shingle_set) >= self.min_shingles:
+            band_keys = self._band_keys(namespace, shingle_set)
+            with self._lock:
+                candidates = set()
+                for band_key in band_keys:
+                    candidates.update(self._buckets.get(band_key, ()))
+                for cache_key in candidates:
+                    _, other, other_directions, _ = self._entries[cache_key]
+                    if _reversed(prompt_directions, other_directions):
+                        # Likely the opposite question, however many words it shares
+                        continue
+                    score = len(shingle_set & other) / len(shingle_set | other)
+                    if score > best_score:
+                        best_key, best_score = cache_key, score
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.lookups += 1
+            self.last_similarity = best_score
+            self.total_lookup_ms += latency_ms
+            self.max_lookup_ms = max(self.max_lookup_ms, latency_ms)
+            if best_key is None or best_score < self.threshold:
+                return None
+            self.hits += 1
+        return {"cache_key": best_key, "similarity": round(best_score, 4), "latency_ms": round(latency_ms, 3)}
+
+    def stats(self):
+        """Return lookup counters, the last similarity score and lookup latency."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "last_similarity": round(self.last_similarity, 4),
+                "avg_lookup_ms": round(self.total_lookup_ms / self.lookups, 3) if self.lookups else 0.0,
+                "max_lookup_ms": round(self.max_lookup_ms, 3),
+            }
+
+
+# Process-wide index, seeded from the persistent response cache
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_shared_index(response_cache):
+    """Return the shared similarity index, or None when the cache or index is disabled."""
+    global _shared_index
+    if response_cache is None or not env_bool("CONSULTANT_SIMILARITY_ENABLED", True):
+        return None
+    with _shared_index_lock:
+        if _shared_index is None:
+            index = SimilarityIndex()
+            for cache_key, namespace, prompt in response_cache.iter_prompts():
+                index.add(prompt, namespace, cache_key)
+            _shared_index = index
+        return _shared_index
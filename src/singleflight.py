@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from admission import DEFAULT_PRIORITY, PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """
+    One in-flight call and the callers waiting on it. The work gets
+    broadcast() as its on_delta callback, which forwards each partial answer
+    to every subscribed caller (a caller whose callback fails is dropped,
+    the others keep receiving), and reads deadline and priority when it
+    needs them: the loosest deadline and highest priority of every caller
+    that has joined so far.
+    """
+
+    def __init__(self, streaming=False):
+        self.streaming = streaming
+        self.parts = []
+        self.task = None
+        self._subscribers = []
+        self._deadlines = []
+        self._priorities = []
+
+    @property
+    def deadline(self):
+        """The latest caller deadline, or None if any caller has none."""
+        if not self._deadlines or None in self._deadlines:
+            return None
+        return max(self._deadlines)
+
+    @property
+    def priority(self):
+        """The highest priority of any caller."""
+        if not self._priorities:
+            return DEFAULT_PRIORITY
+        return min(self._priorities, key=PRIORITIES.__getitem__)
+
+    async def join(self, on_delta=None, deadline=None, priority=None):
+        """
+        Add a caller. Partial answers it missed are passed to its on_delta
+        first. Returns the subscription to hand to leave().
+        """
+        self._deadlines.append(deadline)
+        self._priorities.append(priority or DEFAULT_PRIORITY)
+        subscription = [on_delta]
+        if on_delta is not None and self.streaming:
+            sent = 0
+            while sent < len(self.parts):
+                text = "".join(self.parts[sent:])
+                sent = len(self.parts)
+                if not await self._deliver(subscription, text):
+                    break
+        self._subscribers.append(subscription)
+        return subscription
+
+    def leave(self, subscription):
+        """Stop forwarding partial answers to a caller that is done waiting."""
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+
+    async def broadcast(self, text):
+        """on_delta for the shared work: forward text to every subscribed caller."""
+        self.parts.append(text)
+        for subscription in list(self._subscribers):
+            await self._deliver(subscription, text)
+
+    @staticmethod
+    async def _deliver(subscription, text):
+        on_delta = subscription[0]
+        if on_delta is None:
+            return True
+        try:
+            await on_delta(text)
+        except Exception as e:
+            # e.g. its client disconnected; the shared call carries on for the rest
+            logger.warning("Dropping a progress subscriber whose callback failed: %s", e)
+            subscription[0] = None
+            return False
+        return True
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one.
+    The first caller for a key starts the work; callers arriving while it is
+    still in flight await the same task and receive its result or exception.
+    The work runs as its own task with no caller-specific settings (see
+    Flight), so one caller being cancelled or failing doesn't affect the
+    others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, on_delta=None, deadline=None, priority=None):
+        """
+        Run fn(flight) for key unless an identical call is already in flight,
+        and wait for its result. on_delta receives the partial answers when
+        the first caller asked for streaming.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = Flight(streaming=on_delta is not None)
+            subscription = await flight.join(on_delta, deadline, priority)
+            flight.task = asyncio.ensure_future(fn(flight))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            subscription = await flight.join(on_delta, deadline, priority)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.leave(subscription)
+
+    async def run(self, fn, on_delta=None, deadline=None, priority=None):
+        """Run fn(flight) for a single caller, without coalescing."""
+        flight = Flight(streaming=on_delta is not None)
+        await flight.join(on_delta, deadline, priority)
+        return await fn(flight)
+
+    def stats(self):
+        """Return coalescing counters."""
+        return {
+            "in_flight": len(self._inflight),
+            "upstream_calls": self.leaders,
+            "coalesced_calls": self.coalesced,
+        }
+
+
+# Process-wide group shared by every agent
+_shared_single_flight = None
+
+
+def get_shared_single_flight():
+    """Return the shared single-flight group."""
+    global _shared_single_flight
+    if _shared_single_flight is None:
+        _shared_single_flight = SingleFlight()
+    return _shared_single_flight
@@ -0,0 +1,40 @@
+import random
+import sqlite3
+import time
+
+from config import env_float
+
+
+def _is_busy(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def connect_wal(path, busy_timeout=None):
+    """
+    Open a SQLite database shared by several worker processes and switch it
+    to WAL. Waits up to busy_timeout seconds (CONSULTANT_SQLITE_BUSY_TIMEOUT)
+    for other connections' locks, and retries the WAL switch, which SQLite can
+    refuse with "database is locked" without waiting while several processes
+    open a fresh file at once. Raises sqlite3.Error if the file stays locked.
+    """
+    busy_timeout = busy_timeout if busy_timeout is not None else env_float("CONSULTANT_SQLITE_BUSY_TIMEOUT", 5.0)
+    db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+    try:
+        db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        give_up_at = time.monotonic() + busy_timeout
+        attempt = 0
+        while True:
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+                break
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or time.monotonic() >= give_up_at:
+                    raise
+                attempt += 1
+                time.sleep(random.uniform(0, min(0.5, 0.01 * 2 ** attempt)))
+        db.execute("PRAGMA synchronous=NORMAL")
+    except BaseException:
+        db.close()
+        raise
+    return db
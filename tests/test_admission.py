@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def controller(**kwargs):
+    options = dict(max_concurrency=1, max_queue=16, max_queue_wait=30.0, shed_response="template")
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+async def queue_up(admission, calls, granted):
+    """Queue (name, priority) calls behind a held slot; granted names are appended to granted."""
+
+    async def call(name, priority):
+        await admission.acquire(priority)
+        granted.append(name)
+
+    tasks = {}
+    for name, priority in calls:
+        tasks[name] = asyncio.ensure_future(call(name, priority))
+        await asyncio.sleep(0)
+    return tasks
+
+
+def test_priority_then_arrival_order():
+    async def main():
+        admission = controller()
+        await admission.acquire("normal")
+        granted = []
+        tasks = await queue_up(admission, [
+            ("low-1", "low"), ("normal-1", "normal"), ("high-1", "high"), ("normal-2", "normal"), ("low-2", "low"),
+        ], granted)
+        assert admission.queue_depth() == 5
+        for _ in tasks:
+            admission.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks.values())
+        return granted
+
+    assert asyncio.run(main()) == ["high-1", "normal-1", "normal-2", "low-1", "low-2"]
+
+
+def test_a_full_queue_displaces_the_newest_lower_priority_call():
+    async def main():
+        admission = controller(max_queue=2)
+        await admission.acquire("normal")
+        granted = []
+        tasks = await queue_up(admission, [("low-1", "low"), ("low-2", "low"), ("high-1", "high")], granted)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await tasks["low-2"]
+        assert rejected.value.reason == "displaced"
+        # low-1 makes way for normal-1; then nothing queued is below another normal call
+        tasks.update(await queue_up(admission, [("normal-1", "normal")], granted))
+        with pytest.raises(AdmissionRejected) as rejected:
+            await tasks["low-1"]
+        assert rejected.value.reason == "displaced"
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("normal")
+        assert rejected.value.reason == "queue_full"
+        for _ in range(2):
+            admission.release()
+        await asyncio.gather(tasks["high-1"], tasks["normal-1"])
+        return admission, granted
+
+    admission, granted = asyncio.run(main())
+    assert granted == ["high-1", "normal-1"]
+    assert admission.shed == {"displaced": 2, "queue_full": 1}
+
+
+def test_queue_wait_is_shed_against_the_deadline():
+    async def main():
+        admission = controller()
+        await admission.acquire("normal")
+        # A call that queued until its deadline passed
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("normal", deadline=started + 0.1)
+        assert rejected.value.reason == "queue_wait"
+        assert time.monotonic() - started >= 0.09
+        assert admission.queue_depth() == 0
+
+        # Once calls are known to hold a slot for ~2s, one that can't wait that long is shed at once
+        admission.release(service_time=2.0)
+        await admission.acquire("normal")
+        started = time.monotonic()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("normal", deadline=started + 0.5)
+        assert rejected.value.reason == "queue_wait"
+        assert time.monotonic() - started < 0.05
+
+    asyncio.run(main())
+
+
+def test_a_slot_handed_to_a_cancelled_caller_is_released():
+    async def main():
+        admission = controller()
+        await admission.acquire("normal")
+        granted = []
+        tasks = await queue_up(admission, [("waiter", "normal")], granted)
+        # Hand the slot over, then cancel the waiter before it gets to run
+        admission.release()
+        tasks["waiter"].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tasks["waiter"]
+        assert granted == []
+        assert admission.active == 0
+        await asyncio.wait_for(admission.acquire("normal"), timeout=0.1)
+        assert admission.active == 1
+
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from endpoint_router import Endpoint, EndpointRouter
+
+COMPLETION = {"choices": [{"index": 0, "message": {"role": "assistant", "content": "from b"}}]}
+
+
+async def start_stand_in(status, payload):
+    """A stand-in upstream answering every request at once with status and a JSON payload."""
+    body = json.dumps(payload).encode()
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(
+            f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+
+
+def test_fast_primary_failure_fails_over_with_hedging_on():
+    async def main():
+        server_a, url_a = await start_stand_in(401, {"error": {"message": "invalid api key"}})
+        server_b, url_b = await start_stand_in(200, COMPLETION)
+        a = Endpoint("a", url_a, "key-a", "model-a")
+        b = Endpoint("b", url_b, "key-b", "model-b")
+        # a ranks first and has a p95 well beyond its fast failure, so no hedge is sent
+        a.record(5000.0, True)
+        b.record(10000.0, True)
+        router = EndpointRouter([a, b], hedge=True, hedge_min_samples=1)
+        try:
+            response_data = await router.request({"messages": [{"role": "user", "content": "hi"}]})
+        finally:
+            await router.aclose()
+            server_a.close()
+            server_b.close()
+        assert response_data["endpoint"] == "b"
+        assert response_data["choices"][0]["message"]["content"] == "from b"
+        assert router.hedged == 0
+        assert router.failovers == 1
+
+    asyncio.run(main())
+
+
+def test_cancelling_the_caller_before_the_hedge_cancels_the_primary():
+    async def main():
+        async def hang(reader, writer):
+            await reader.read(65536)
+            await asyncio.Event().wait()
+
+        server = await asyncio.start_server(hang, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/openai/v1/chat/completions"
+        a = Endpoint("a", url, "key-a", "model-a")
+        b = Endpoint("b", url, "key-b", "model-b")
+        # Hedge only after 5s, so the caller is cancelled while waiting on the primary alone
+        a.record(5000.0, True)
+        b.record(10000.0, True)
+        router = EndpointRouter([a, b], hedge=True, hedge_min_samples=1)
+        request = asyncio.ensure_future(router.request({"messages": [{"role": "user", "content": "hi"}]}))
+        await asyncio.sleep(0.2)
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        await asyncio.sleep(0)
+        leftover = [task for task in asyncio.all_tasks()
+                    if task.get_coro().__qualname__ == "Endpoint.request" and not task.done()]
+        await router.aclose()
+        server.close()
+        return leftover
+
+    assert asyncio.run(main()) == []
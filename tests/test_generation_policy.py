@@ -0,0 +1,37 @@
+import pytest
+
+from generation_policy import CLARIFICATION, GenerationPolicy
+
+SHORT_SUBSTANTIVE = [
+    "How should we shard a 5TB Postgres table?",
+    "How do I migrate our monolith to microservices?",
+    "What database should we use for a multi-tenant SaaS?",
+    "Is it safe to store passwords in plain text?",
+    "Is it worth migrating to Kubernetes?",
+]
+
+CLARIFICATIONS = [
+    "what does idempotent mean here?",
+    "What does CAP stand for?",
+    "Define eventual consistency",
+    "Is it the same as a saga?",
+    "Is that what you meant by sticky sessions?",
+]
+
+
+@pytest.mark.parametrize("query", SHORT_SUBSTANTIVE)
+def test_short_substantive_questions_get_a_full_budget(query):
+    policy = GenerationPolicy(policies={}, enabled=True)
+    query_class, settings = policy.select(query)
+    assert query_class != CLARIFICATION
+    assert settings["max_tokens"] >= policy.policies["general"]["max_tokens"]
+
+
+@pytest.mark.parametrize("query", CLARIFICATIONS)
+def test_short_clarifications(query):
+    assert GenerationPolicy(policies={}).classify(query) == CLARIFICATION
+
+
+def test_long_prompts_are_never_clarifications():
+    query = "what does it mean when " + "the service " * 10 + "returns nothing here?"
+    assert GenerationPolicy(policies={}).classify(query) != CLARIFICATION
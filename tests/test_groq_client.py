@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, OPEN
+from groq_client import AsyncGroqClient
+from rate_limiter import RateLimitScheduler
+
+REQUEST = {"model": "test", "messages": [{"role": "user", "content": "hello"}]}
+
+
+async def start_hanging_server():
+    """A stand-in upstream that accepts connections and never answers."""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        await reader.read(65536)
+        await asyncio.Event().wait()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}/openai/v1/chat/completions", connections
+
+
+async def close_server(server, connections):
+    for writer in connections:
+        writer.close()
+    server.close()
+
+
+def make_client(api_url, failure_threshold=3):
+    return AsyncGroqClient(
+        api_url, http2=False, max_retries=0,
+        scheduler=RateLimitScheduler(requests_per_minute=0),
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=60.0),
+    )
+
+
+def test_deadline_cancellations_open_the_breaker():
+    async def main():
+        server, api_url, connections = await start_hanging_server()
+        client = make_client(api_url)
+        try:
+            for _ in range(3):
+                # As mcpserver.consult does: the caller's own timer cuts the request off at its
+                # deadline, here a little early so httpx's matching timeout can't win the race
+                deadline = time.monotonic() + 0.2
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(client.post_json(REQUEST, "key", deadline=deadline), timeout=0.18)
+            assert client.breaker.state == OPEN
+            result = await client.post_json(REQUEST, "key", deadline=time.monotonic() + 0.2)
+            assert result.get("circuit_open")
+        finally:
+            await client.aclose()
+            await close_server(server, connections)
+
+    asyncio.run(main())
+
+
+def test_early_cancellation_is_not_a_failure():
+    async def main():
+        server, api_url, connections = await start_hanging_server()
+        client = make_client(api_url, failure_threshold=1)
+        try:
+            # The caller goes away long before the request's deadline
+            task = asyncio.ensure_future(client.post_json(REQUEST, "key", deadline=time.monotonic() + 30.0))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert client.breaker.stats()["consecutive_failures"] == 0
+        finally:
+            await client.aclose()
+            await close_server(server, connections)
+
+    asyncio.run(main())
+
+
+def test_a_client_left_by_another_loop_is_closed():
+    client = make_client("http://127.0.0.1:9/openai/v1/chat/completions")
+
+    async def get_pool():
+        return client._get_client()
+
+    first = asyncio.run(get_pool())
+
+    async def replace():
+        second = client._get_client()
+        await asyncio.sleep(0.05)
+        await client.aclose()
+        return second
+
+    second = asyncio.run(replace())
+    assert second is not first
+    assert first.is_closed
@@ -0,0 +1,45 @@
+from history_manager import SUMMARY_PREFIX, HistoryManager, estimate_message_tokens
+
+
+def conversation(turns):
+    history = [{"role": "system", "content": "You are a consultant."}]
+    for n in range(turns):
+        history.append({"role": "user", "content": f"question {n} " + "x" * 200})
+        history.append({"role": "assistant", "content": f"answer {n} " + "y" * 200})
+    return history
+
+
+def test_a_history_within_budget_is_unchanged():
+    manager = HistoryManager(max_prompt_tokens=6000)
+    history = conversation(3)
+    assert manager.compact(history) == history
+    assert manager.stats()["compactions"] == 0
+
+
+def test_old_turns_are_folded_into_a_summary():
+    manager = HistoryManager(max_prompt_tokens=600, max_summary_tokens=50)
+    history = conversation(6)
+    compacted = manager.compact(history)
+
+    assert compacted[0] == history[0]
+    assert compacted[1]["role"] == "system" and compacted[1]["content"].startswith(SUMMARY_PREFIX)
+    kept = compacted[2:]
+    assert kept and kept == history[len(history) - len(kept):]
+    assert kept[0]["role"] == "user"
+    assert estimate_message_tokens(compacted) <= 600
+    stats = manager.stats()
+    assert stats["compactions"] == 1
+    assert stats["turns_dropped"] == 6 - len(kept) // 2
+
+    # Compacting again keeps the existing summary rather than adding another
+    again = manager.compact(compacted + conversation(2)[1:])
+    assert sum(m["content"].startswith(SUMMARY_PREFIX) for m in again) == 1
+
+
+def test_build_messages_leaves_room_for_the_query():
+    manager = HistoryManager(max_prompt_tokens=600, max_summary_tokens=50)
+    query = "What about caching? " + "z" * 200
+    messages = manager.build_messages(conversation(6), query)
+    assert messages[-1] == {"role": "user", "content": query}
+    assert estimate_message_tokens(messages) <= 600
+    assert manager.stats()["last_prompt_tokens"] == estimate_message_tokens(messages)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import re
+
+import admission
+import endpoint_router
+import groq_client
+import mcpserver
+import singleflight
+from agent_registry import AgentRegistry
+
+
+async def start_upstream(state):
+    """
+    A stand-in chat completions endpoint. Prompts containing "fail" get a
+    500; "delay=<seconds>" in a prompt holds its answer back that long.
+    Tracks the most requests it had in flight at once.
+    """
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(re.search(rb"(?i)content-length: *(\d+)", head).group(1))
+                prompt = json.loads(await reader.readexactly(length))["messages"][-1]["content"]
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+                delay = re.search(r"delay=([\d.]+)", prompt)
+                await asyncio.sleep(float(delay.group(1)) if delay else 0.01)
+                state["in_flight"] -= 1
+                if "fail" in prompt:
+                    status, body = "500 Internal Server Error", {"error": {"message": "upstream failure"}}
+                else:
+                    status, body = "200 OK", {
+                        "choices": [{"message": {"role": "assistant", "content": f"answer to {prompt}"},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+                    }
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/openai/v1/chat/completions"
+
+
+def run_batch(monkeypatch, prompts, **kwargs):
+    """Run ask_software_engineer_batch against the stand-in upstream with fresh shared state."""
+    monkeypatch.setenv("GROQ_API_KEY", "gsk_test_key_never_sent_anywhere")
+    monkeypatch.setenv("GROQ_HTTP2", "false")
+    monkeypatch.setenv("GROQ_MAX_RETRIES", "0")
+    monkeypatch.setenv("CONSULTANT_BREAKER_FAILURES", "100")
+    monkeypatch.setenv("CONSULTANT_CACHE_ENABLED", "false")
+    monkeypatch.setattr(groq_client, "_shared_clients", {})
+    monkeypatch.setattr(admission, "_shared_controller", None)
+    monkeypatch.setattr(singleflight, "_shared_single_flight", None)
+    monkeypatch.setattr(endpoint_router, "_shared_router_loaded", True)
+    monkeypatch.setattr(endpoint_router, "_shared_router", None)
+    monkeypatch.setattr(mcpserver, "agent_registry", AgentRegistry(factory_loader=mcpserver.load_agents))
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def main():
+        server, api_url = await start_upstream(state)
+        monkeypatch.setenv("GROQ_API_URL", api_url)
+        try:
+            return await mcpserver.ask_software_engineer_batch(prompts, **kwargs)
+        finally:
+            for client in groq_client.shared_clients():
+                await client.aclose()
+            server.close()
+
+    return asyncio.run(main()), state
+
+
+def test_results_come_back_in_prompt_order(monkeypatch):
+    # Earlier prompts take longer, so they finish last
+    prompts = [f"How should service {n} cache its reads? delay={0.2 - n * 0.04:.2f}" for n in range(5)]
+    results, _ = run_batch(monkeypatch, prompts, max_concurrency=5)
+    assert [result["index"] for result in results] == list(range(5))
+    assert [result["response"] for result in results] == [f"answer to {prompt}" for prompt in prompts]
+    assert all(result["status"] == "ok" and result["source"] == "upstream" for result in results)
+
+
+def test_upstream_errors_fall_back_per_item(monkeypatch):
+    prompts = [
+        "How should we shard the orders table?",
+        "How should we fail over the primary database?",
+        "How should we version a public REST API?",
+    ]
+    results, _ = run_batch(monkeypatch, prompts)
+    assert [result["status"] for result in results] == ["ok", "fallback", "ok"]
+    assert results[1]["source"] == "fallback" and results[1]["response"]
+    assert results[0]["response"] == f"answer to {prompts[0]}"
+
+
+def test_max_concurrency_bounds_the_upstream_calls(monkeypatch):
+    prompts = [f"How should worker pool {n} be sized? delay=0.05" for n in range(6)]
+    results, state = run_batch(monkeypatch, prompts, max_concurrency=2)
+    assert all(result["status"] == "ok" for result in results)
+    assert state["max_in_flight"] == 2
+
+
+def test_an_empty_batch(monkeypatch):
+    results, state = run_batch(monkeypatch, [])
+    assert results == []
+    assert state["max_in_flight"] == 0
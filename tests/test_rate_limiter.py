@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from rate_limiter import RateLimitScheduler
+
+
+def test_no_local_pacing_by_default(monkeypatch):
+    monkeypatch.delenv("CONSULTANT_RATE_LIMIT_RPM", raising=False)
+    scheduler = RateLimitScheduler()
+
+    async def main():
+        deadline = time.monotonic() + 1.0
+        for _ in range(100):
+            await scheduler.acquire(deadline)
+
+    asyncio.run(main())
+    assert scheduler.requests_per_minute == 0
+    assert scheduler.throttled == 0
+
+
+def test_paces_from_the_server_headers(monkeypatch):
+    monkeypatch.delenv("CONSULTANT_RATE_LIMIT_RPM", raising=False)
+    scheduler = RateLimitScheduler()
+    scheduler.update_from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "200ms"})
+
+    async def main():
+        started = time.monotonic()
+        await scheduler.acquire(started + 5.0)
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.15
+    assert scheduler.throttled == 1
+
+
+def test_retry_after_holds_requests_back():
+    scheduler = RateLimitScheduler(requests_per_minute=0)
+    scheduler.block_for(0.2)
+
+    async def main():
+        started = time.monotonic()
+        await scheduler.acquire(started + 5.0)
+        return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.15
@@ -0,0 +1,88 @@
+import time
+
+import session_store
+from agents_updated import SoftwareEngineerAgent
+from session_store import SessionStore
+
+
+def turn(n):
+    return [{"role": "user", "content": f"question {n}"}, {"role": "assistant", "content": f"answer {n}"}]
+
+
+def test_two_workers_append_to_one_session(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    a, b = SessionStore(path), SessionStore(path)
+    assert a.append("s1", "m", turn(1)) == 2
+
+    messages, version = b.load("s1", "m")
+    assert (messages, version) == (turn(1), 2)
+    assert b.load("s1", "m", known_version=2) == (None, 2)
+
+    assert b.append("s1", "m", turn(2)) == 4
+    assert a.load("s1", "m", known_version=2) == (turn(1) + turn(2), 4)
+    # Sessions are kept per model
+    assert a.load("s1", "other") == (None, 0)
+    a.close()
+    b.close()
+
+
+def test_a_checkpoint_replaces_the_history_for_every_worker(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    a, b = SessionStore(path, cleanup_interval=3600), SessionStore(path, cleanup_interval=3600)
+    # The first write on each store runs the cleanup that's due since it opened
+    a.append("s1", "m", turn(1))
+    b.append("s2", "m", turn(1))
+    a.append("s1", "m", turn(2))
+    summary = [{"role": "system", "content": "summary"}]
+    assert b.replace("s1", "m", summary + turn(2)) == 7
+    assert a.load("s1", "m", known_version=4) == (summary + turn(2), 7)
+
+    # The four rows before the checkpoint are left for cleanup()
+    assert a.cleanup() == 4
+    # The checkpoint, plus s2's turn
+    assert a.stats()["turns"] == 3 + 2
+    assert b.load("s1", "m") == (summary + turn(2), 7)
+    a.close()
+    b.close()
+
+
+def test_expired_sessions_are_cleaned_up(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"), ttl=0.05, cleanup_interval=3600)
+    store.append("s1", "m", turn(1))
+    time.sleep(0.1)
+    assert store.load("s1", "m") == (None, 0)
+
+    assert store.cleanup() == 2
+    stats = store.stats()
+    assert (stats["sessions"], stats["turns"], stats["expired"]) == (0, 0, 1)
+    # A new turn starts the session afresh rather than resurrecting the old rows
+    store.append("s1", "m", turn(2))
+    time.sleep(0.1)
+    store.ttl = 3600
+    assert store.load("s1", "m") == (turn(2), 2)
+    store.close()
+
+
+def test_agents_reload_after_a_version_conflict(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "gsk_test_key_never_sent_anywhere")
+    monkeypatch.setenv("CONSULTANT_CACHE_PATH", str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setenv("CONSULTANT_SESSION_PATH", str(tmp_path / "sessions.sqlite3"))
+    monkeypatch.setattr(session_store, "_shared_store", None)
+    # Two workers serving the same session
+    a, b = SoftwareEngineerAgent(session_id="s1"), SoftwareEngineerAgent(session_id="s1")
+    a._sync_session()
+    b._sync_session()
+
+    a._remember("question 1", "answer 1")
+    assert a.session_version == 2
+    # b's append lands after a's, so b's copy is missing a's turn
+    b._remember("question 2", "answer 2")
+    assert b.session_version == 0
+
+    b._sync_session()
+    a._sync_session()
+    for agent in (a, b):
+        assert agent.session_version == 4
+        assert agent.conversation_history[1:] == turn(1) + turn(2)
+        assert agent.conversation_history[0]["content"] == agent.system_prompt
+    session_store.get_shared_session_store().close()
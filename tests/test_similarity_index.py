@@ -0,0 +1,61 @@
+import pytest
+
+from similarity_index import SimilarityIndex
+
+REVERSED_PAIRS = [
+    ("How do I migrate from MySQL to PostgreSQL?", "How do I migrate from PostgreSQL to MySQL?"),
+    ("Why is Redis faster than Memcached for caching?", "Why is Memcached faster than Redis for caching?"),
+    ("How should we port our Python service to Go?", "How should we port our Go service to Python?"),
+    ("Should we use microservices instead of a monolith?", "Should we use a monolith instead of microservices?"),
+    (
+        "We run a large multi tenant SaaS billing platform with heavy reporting workloads and nightly batch "
+        "jobs, and we are planning to migrate our primary datastore from MySQL to PostgreSQL next quarter; "
+        "what are the main risks and how should we sequence the cutover?",
+        "We run a large multi tenant SaaS billing platform with heavy reporting workloads and nightly batch "
+        "jobs, and we are planning to migrate our primary datastore from PostgreSQL to MySQL next quarter; "
+        "what are the main risks and how should we sequence the cutover?",
+    ),
+]
+
+PARAPHRASES = [
+    # Reordered without a directional word: the same question
+    ("optimize my slow SQL query", "my SQL query is slow, how to optimize"),
+    ("How do I optimize slow SQL queries?", "optimizing a slow SQL query"),
+    ("What are best practices for securing a REST API?", "best practices to secure REST APIs"),
+]
+
+
+def lookup_after_add(cached, prompt, **kwargs):
+    index = SimilarityIndex(**kwargs)
+    index.add(cached, "ns", "cached-key")
+    return index.lookup(prompt, "ns")
+
+
+@pytest.mark.parametrize("cached, prompt", REVERSED_PAIRS)
+def test_reversed_questions_do_not_match(cached, prompt):
+    assert lookup_after_add(cached, prompt) is None
+    assert lookup_after_add(prompt, cached) is None
+
+
+@pytest.mark.parametrize("cached, prompt", REVERSED_PAIRS)
+def test_reversed_questions_do_not_match_at_a_low_threshold(cached, prompt):
+    assert lookup_after_add(cached, prompt, threshold=0.3) is None
+
+
+def test_reversal_with_a_reworded_tail_does_not_match():
+    cached = "How do we migrate from MySQL to PostgreSQL without downtime?"
+    prompt = "How do we migrate from PostgreSQL to MySQL with no downtime?"
+    assert lookup_after_add(cached, prompt, threshold=0.3) is None
+
+
+@pytest.mark.parametrize("cached, prompt", PARAPHRASES)
+def test_rewordings_still_match(cached, prompt):
+    match = lookup_after_add(cached, prompt)
+    assert match is not None
+    assert match["cache_key"] == "cached-key"
+
+
+def test_namespaces_are_separate():
+    index = SimilarityIndex()
+    index.add(PARAPHRASES[0][0], "ns", "cached-key")
+    assert index.lookup(PARAPHRASES[0][1], "other") is None
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def collector():
+    received = []
+
+    async def on_delta(text):
+        received.append(text)
+
+    return received, on_delta
+
+
+async def failing_on_delta(text):
+    raise ConnectionError("client went away")
+
+
+def streaming_work(started, proceed, seen=None):
+    async def fn(flight):
+        await flight.broadcast("Use ")
+        started.set()
+        await proceed.wait()
+        if seen is not None:
+            seen.update(deadline=flight.deadline, priority=flight.priority)
+        await flight.broadcast("indexes.")
+        return {"answer": "Use indexes."}
+    return fn
+
+
+def test_followers_receive_progress_including_what_they_missed():
+    async def main():
+        group = SingleFlight()
+        started, proceed = asyncio.Event(), asyncio.Event()
+        leader_deltas, leader_on_delta = collector()
+        follower_deltas, follower_on_delta = collector()
+        leader = asyncio.ensure_future(group.do("k", streaming_work(started, proceed), leader_on_delta))
+        await started.wait()
+        follower = asyncio.ensure_future(group.do("k", streaming_work(started, proceed), follower_on_delta))
+        await asyncio.sleep(0)
+        proceed.set()
+        results = await asyncio.gather(leader, follower)
+        return results, leader_deltas, follower_deltas, group
+
+    results, leader_deltas, follower_deltas, group = asyncio.run(main())
+    assert results == [{"answer": "Use indexes."}] * 2
+    assert "".join(leader_deltas) == "Use indexes."
+    assert "".join(follower_deltas) == "Use indexes."
+    assert group.stats()["upstream_calls"] == 1
+    assert group.stats()["coalesced_calls"] == 1
+
+
+def test_a_failing_leader_callback_does_not_fail_the_others():
+    async def main():
+        group = SingleFlight()
+        started, proceed = asyncio.Event(), asyncio.Event()
+        follower_deltas, follower_on_delta = collector()
+        leader = asyncio.ensure_future(group.do("k", streaming_work(started, proceed), failing_on_delta))
+        await started.wait()
+        follower = asyncio.ensure_future(group.do("k", streaming_work(started, proceed), follower_on_delta))
+        await asyncio.sleep(0)
+        proceed.set()
+        return await asyncio.gather(leader, follower), follower_deltas
+
+    results, follower_deltas = asyncio.run(main())
+    assert results == [{"answer": "Use indexes."}] * 2
+    assert "".join(follower_deltas) == "Use indexes."
+
+
+def test_shared_work_gets_the_loosest_deadline_and_highest_priority():
+    async def main():
+        group = SingleFlight()
+        started, proceed, seen = asyncio.Event(), asyncio.Event(), {}
+        loop_time = asyncio.get_running_loop().time()
+        leader = asyncio.ensure_future(group.do(
+            "k", streaming_work(started, proceed, seen), deadline=loop_time + 5, priority="low"
+        ))
+        await started.wait()
+        follower = asyncio.ensure_future(group.do(
+            "k", streaming_work(started, proceed, seen), deadline=loop_time + 50, priority="high"
+        ))
+        await asyncio.sleep(0)
+        proceed.set()
+        await asyncio.gather(leader, follower)
+        return seen, loop_time
+
+    seen, loop_time = asyncio.run(main())
+    assert seen == {"deadline": loop_time + 50, "priority": "high"}
+
+
+def test_a_caller_giving_up_leaves_the_shared_work_running():
+    async def main():
+        group = SingleFlight()
+        started, proceed = asyncio.Event(), asyncio.Event()
+        leader_deltas, leader_on_delta = collector()
+        leader = asyncio.ensure_future(group.do("k", streaming_work(started, proceed), leader_on_delta))
+        await started.wait()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(group.do("k", streaming_work(started, proceed)), timeout=0.05)
+        proceed.set()
+        return await leader, leader_deltas
+
+    result, leader_deltas = asyncio.run(main())
+    assert result == {"answer": "Use indexes."}
+    assert "".join(leader_deltas) == "Use indexes."
@@ -0,0 +1,104 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import threading
+
+import response_cache
+import session_store
+from agents_updated import SoftwareEngineerAgent
+from response_cache import ResponseCache
+from session_store import SessionStore
+
+
+def test_open_waits_for_a_held_lock(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    holder = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN EXCLUSIVE")
+    release = threading.Timer(0.3, lambda: holder.execute("COMMIT"))
+    release.start()
+    try:
+        cache = ResponseCache(path)
+    finally:
+        release.join()
+        holder.close()
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    cache.close()
+
+
+def open_both(path, barrier, results):
+    barrier.wait()
+    try:
+        ResponseCache(path + ".cache").close()
+        SessionStore(path + ".sessions").close()
+        results.put(True)
+    except sqlite3.Error as e:
+        results.put(repr(e))
+
+
+def test_concurrent_opens_of_a_fresh_file(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = 8
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [
+        context.Process(target=open_both, args=(str(tmp_path / "shared"), barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join()
+    assert outcomes == [True] * workers
+
+
+def test_agents_pick_up_a_cache_that_failed_to_open(tmp_path, monkeypatch):
+    monkeypatch.setenv("CONSULTANT_CACHE_PATH", str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setenv("CONSULTANT_SESSION_PATH", str(tmp_path / "sessions.sqlite3"))
+    monkeypatch.setattr(response_cache, "_shared_cache", None)
+    monkeypatch.setattr(session_store, "_shared_store", None)
+    # As if the first open had just failed
+    monkeypatch.setattr(response_cache, "_shared_cache_retry_at", float("inf"))
+    agent = SoftwareEngineerAgent(session_id="s1")
+    assert agent.response_cache is None
+    assert agent.session_store is not None
+
+    monkeypatch.setattr(response_cache, "_shared_cache_retry_at", 0.0)
+    assert agent.response_cache is not None
+    agent.response_cache.close()
+    agent.session_store.close()
+
+
+def test_cache_and_session_io_run_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "gsk_test_key_never_sent_anywhere")
+    monkeypatch.setenv("CONSULTANT_CACHE_PATH", str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setenv("CONSULTANT_SESSION_PATH", str(tmp_path / "sessions.sqlite3"))
+    monkeypatch.setattr(response_cache, "_shared_cache", None)
+    monkeypatch.setattr(session_store, "_shared_store", None)
+    threads = set()
+    for cls, name in ((ResponseCache, "get"), (SessionStore, "load"), (SessionStore, "append")):
+        method = getattr(cls, name)
+
+        def recording(self, *args, _method=method, **kwargs):
+            threads.add(threading.current_thread())
+            return _method(self, *args, **kwargs)
+
+        monkeypatch.setattr(cls, name, recording)
+
+    stateless = SoftwareEngineerAgent()
+    query = "How should we version a public REST API?"
+    query_class, policy = stateless.generation_policy.select(query)
+    data = stateless._build_request_data(stateless.history_manager.build_messages(
+        stateless.conversation_history, query), policy)
+    namespace = stateless._cache_namespace(data)
+    stateless.response_cache.put(ResponseCache.make_key(query, namespace), query, "cached answer", namespace)
+
+    async def main():
+        first = await stateless.aconsult(query)
+        second = await SoftwareEngineerAgent(session_id="s1").aconsult(query)
+        return first, second, threading.current_thread()
+
+    first, second, loop_thread = asyncio.run(main())
+    assert first["source"] == second["source"] == "cache"
+    assert threads and loop_thread not in threads
+    stateless.response_cache.close()
+    session_store.get_shared_session_store().close()